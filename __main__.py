@@ -6,9 +6,10 @@ import asyncio
 import sys
 import os
 
-# Add the current directory to Python path
+# Add the current directory to Python path (once)
 current_dir = os.path.dirname(os.path.abspath(__file__))
-sys.path.insert(0, current_dir)
+if current_dir not in sys.path:
+    sys.path.insert(0, current_dir)
 
 # Import and run the modular server
 from server_modular import main
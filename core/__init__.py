@@ -4,13 +4,14 @@ Contains configuration, logging, and common utilities.
 """
 
 from .config import ServerConfig
-from .logging import setup_logging, debug_log
+from .logging import setup_logging, debug_log, DEBUG_ENABLED
 from .exceptions import TensorDockError, ConnectionError, KernelError
 
 __all__ = [
     'ServerConfig',
     'setup_logging', 
     'debug_log',
+    'DEBUG_ENABLED',
     'TensorDockError',
     'ConnectionError',
     'KernelError'
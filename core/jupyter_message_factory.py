@@ -10,6 +10,12 @@ from typing import Dict, Any, Optional
 class JupyterMessageFactory:
     """Factory for creating standardized Jupyter protocol messages."""
     
+    @staticmethod
+    def dig(message: Dict[str, Any], section: str, key: str, default: Any = None) -> Any:
+        """Read message[section][key] without allocating a fallback dict."""
+        inner = message.get(section)
+        return inner.get(key, default) if isinstance(inner, dict) else default
+    
     @staticmethod
     def create_execute_request(code: str, cell_id: str = 'unknown', silent: bool = False, 
                               store_history: bool = True, allow_stdin: bool = False) -> Dict[str, Any]:
@@ -89,5 +95,5 @@ class JupyterMessageFactory:
             'username': header.get('username'),
             'session': header.get('session'),
             'comm_id': content.get('comm_id'),
-            'parent_msg_id': message.get('parent_header', {}).get('msg_id')
+            'parent_msg_id': JupyterMessageFactory.dig(message, 'parent_header', 'msg_id')
         }
@@ -1,12 +1,16 @@
 """
 Centralized logging setup for TensorDock server.
 """
+import json
 import logging
 import datetime
 import os
 import tempfile
 from typing import Any, Optional, Dict
 
+# Verbose per-message tracing. Hot paths check this before building log payloads.
+DEBUG_ENABLED = os.environ.get("TENSORDOCK_DEBUG", "0").lower() in ("1", "true", "yes")
+
 
 def _resolve_log_dir() -> str:
     """Determine a writable log directory respecting container constraints."""
@@ -84,25 +88,28 @@ def debug_log(message: str, data: Optional[Any] = None, level: str = "INFO") ->
         data: Optional data to log
         level: Log level (INFO, DEBUG, WARNING, ERROR)
     """
+    log_level = getattr(logging, level.upper())
+    if not logging.getLogger().isEnabledFor(log_level):
+        return
+    
     timestamp = datetime.datetime.now().strftime("%H:%M:%S.%f")[:-3]
     
     if data:
         if isinstance(data, dict):
             # Pretty print complex data structures
-            import json
             data_str = json.dumps(data, indent=2, default=str)
             logging.log(
-                getattr(logging, level.upper()),
+                log_level,
                 f"[{timestamp}] {message}\nData: {data_str}"
             )
         else:
             logging.log(
-                getattr(logging, level.upper()),
+                log_level,
                 f"[{timestamp}] {message} - {data}"
             )
     else:
         logging.log(
-            getattr(logging, level.upper()),
+            log_level,
             f"[{timestamp}] {message}"
         )
 
@@ -110,9 +117,14 @@ def debug_log(message: str, data: Optional[Any] = None, level: str = "INFO") ->
 class LoggerMixin:
     """Mixin class to add logging capabilities to other classes."""
     
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.logger = logging.getLogger(f"{self.__class__.__module__}.{self.__class__.__name__}")
+    # Empty so subclasses that declare __slots__ get no per-instance __dict__
+    __slots__ = ()
+    
+    @property
+    def logger(self) -> logging.Logger:
+        """Logger named after the class (logging.getLogger caches it, so no per-instance slot)."""
+        cls = type(self)
+        return logging.getLogger(f"{cls.__module__}.{cls.__name__}")
     
     def log_debug(self, message: str, data: Optional[Any] = None):
         """Log debug message."""
@@ -3,17 +3,120 @@ Message deduplication service for TensorDock server.
 Centralizes all message deduplication logic to prevent redundancy.
 """
 
-from typing import Dict, Set, Any
+import hashlib
+from typing import Dict, Set, Any, List
 from core.logging import LoggerMixin, debug_log
 
 
+class BloomDedup:
+    """Fixed-size Bloom filter for message ID deduplication.
+    
+    Memory stays constant no matter how many IDs are seen. Once enough bits
+    are set that the false-positive rate would exceed the target, the filter
+    starts over with a fresh bit array.
+    """
+    
+    def __init__(self, size_bits: int = 1 << 22, num_hashes: int = 7, max_false_positive_rate: float = 0.001):
+        self.size_bits = size_bits
+        self.num_hashes = num_hashes
+        # FPR ~= fill_ratio ** k, so saturate once the fill ratio reaches fpr ** (1/k)
+        self.max_set_bits = int(size_bits * max_false_positive_rate ** (1.0 / num_hashes))
+        self.reset()
+    
+    def reset(self):
+        """Discard all recorded keys."""
+        self.bits = bytearray((self.size_bits + 7) >> 3)
+        self.set_bits = 0
+        self.count = 0
+    
+    def _positions(self, key: bytes) -> List[int]:
+        """Derive k bit positions from one digest via double hashing (h1 + i*h2)."""
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        size = self.size_bits
+        return [(h1 + i * h2) % size for i in range(self.num_hashes)]
+    
+    def __contains__(self, key: bytes) -> bool:
+        bits = self.bits
+        for pos in self._positions(key):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+    
+    def __len__(self) -> int:
+        return self.count
+    
+    def add(self, key: bytes):
+        """Record a key."""
+        self.check_and_add(key)
+    
+    def check_and_add(self, key: bytes) -> bool:
+        """Record a key, returning True if it was (probably) already present."""
+        if self.set_bits >= self.max_set_bits:
+            self.reset()
+        
+        bits = self.bits
+        newly_set = 0
+        for pos in self._positions(key):
+            idx = pos >> 3
+            mask = 1 << (pos & 7)
+            if not bits[idx] & mask:
+                bits[idx] |= mask
+                newly_set += 1
+        
+        if newly_set:
+            self.set_bits += newly_set
+            self.count += 1
+            return False
+        return True
+    
+    @property
+    def fill_ratio(self) -> float:
+        return self.set_bits / self.size_bits
+
+
+class ShardedSeenSet:
+    """Bounded membership set split into independently sized shards.
+    
+    Each shard is a dict used as an insertion-ordered set, so it rehashes on
+    its own and evicts its oldest key once it reaches ``max_per_shard``.
+    """
+    
+    def __init__(self, num_shards: int = 16, max_per_shard: int = 4096):
+        if num_shards & (num_shards - 1):
+            raise ValueError("num_shards must be a power of two")
+        self.mask = num_shards - 1
+        self.max_per_shard = max_per_shard
+        self.shards: List[Dict[Any, None]] = [{} for _ in range(num_shards)]
+    
+    def __contains__(self, key) -> bool:
+        return key in self.shards[hash(key) & self.mask]
+    
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self.shards)
+    
+    def add(self, key):
+        """Record a key, evicting the shard's oldest key when it is full."""
+        shard = self.shards[hash(key) & self.mask]
+        if key in shard:
+            return
+        if len(shard) >= self.max_per_shard:
+            del shard[next(iter(shard))]
+        shard[key] = None
+    
+    def clear(self):
+        for shard in self.shards:
+            shard.clear()
+
+
 class MessageDeduplicator(LoggerMixin):
     """Centralized message deduplication service."""
     
     def __init__(self):
         # Global message tracking
-        self.processed_messages: Set[str] = set()  # Track all processed message IDs
-        self.comm_message_tracker: Dict[str, Set[str]] = {}  # comm_id -> set of processed msg_ids
+        self.processed_messages = BloomDedup()  # Fixed-memory record of processed message IDs
+        self.processed_comm_messages = ShardedSeenSet()  # "comm_id\x00msg_id" keys, FIFO-bounded per shard
         self.most_recent_comm_messages: Dict[str, Dict[str, Any]] = {}  # kernel_id -> most recent comm message
         
         debug_log(f"🔄 [MessageDeduplicator] Message deduplication service initialized")
@@ -24,7 +127,7 @@ class MessageDeduplicator(LoggerMixin):
             return False
             
         # Check global processed messages
-        if msg_id in self.processed_messages:
+        if msg_id.encode() in self.processed_messages:
             debug_log(f"🔄 [MessageDeduplicator] Duplicate message detected", {
                 "msg_id": msg_id,
                 "comm_id": comm_id,
@@ -33,15 +136,54 @@ class MessageDeduplicator(LoggerMixin):
             return True
         
         # Check comm message tracker
-        if comm_id and comm_id in self.comm_message_tracker:
-            if msg_id in self.comm_message_tracker[comm_id]:
+        if comm_id and f"{comm_id}\x00{msg_id}" in self.processed_comm_messages:
+            debug_log(f"🔄 [MessageDeduplicator] Duplicate comm message detected", {
+                "msg_id": msg_id,
+                "comm_id": comm_id,
+                "kernel_id": kernel_id
+            })
+            return True
+        
+        return False
+    
+    def check_and_mark(self, msg_id: str, comm_id: str = None, kernel_id: str = None, message: Dict[str, Any] = None) -> bool:
+        """Check a message and mark it processed in one pass; returns True if it is a duplicate."""
+        if not msg_id:
+            return False
+        
+        # One digest for both the membership test and the insert
+        if self.processed_messages.check_and_add(msg_id.encode()):
+            debug_log(f"🔄 [MessageDeduplicator] Duplicate message detected", {
+                "msg_id": msg_id,
+                "comm_id": comm_id,
+                "kernel_id": kernel_id
+            })
+            return True
+        
+        if comm_id:
+            comm_key = f"{comm_id}\x00{msg_id}"
+            if comm_key in self.processed_comm_messages:
                 debug_log(f"🔄 [MessageDeduplicator] Duplicate comm message detected", {
                     "msg_id": msg_id,
                     "comm_id": comm_id,
                     "kernel_id": kernel_id
                 })
                 return True
+            self.processed_comm_messages.add(comm_key)
         
+        # Track most recent comm message by kernel
+        if kernel_id and comm_id and message:
+            self.most_recent_comm_messages[kernel_id] = {
+                'comm_id': comm_id,
+                'msg_id': msg_id,
+                'message': message
+            }
+        
+        debug_log(f"✅ [MessageDeduplicator] Message marked as processed", {
+            "msg_id": msg_id,
+            "comm_id": comm_id,
+            "kernel_id": kernel_id
+        })
         return False
     
     def mark_processed(self, msg_id: str, comm_id: str = None, kernel_id: str = None, message: Dict[str, Any] = None):
@@ -50,13 +192,11 @@ class MessageDeduplicator(LoggerMixin):
             return
             
         # Add to global processed messages
-        self.processed_messages.add(msg_id)
+        self.processed_messages.add(msg_id.encode())
         
-        # Track comm messages by comm_id
+        # Track comm messages under one compound key; shards evict their oldest keys
         if comm_id:
-            if comm_id not in self.comm_message_tracker:
-                self.comm_message_tracker[comm_id] = set()
-            self.comm_message_tracker[comm_id].add(msg_id)
+            self.processed_comm_messages.add(f"{comm_id}\x00{msg_id}")
         
         # Track most recent comm message by kernel
         if kernel_id and comm_id and message:
@@ -73,22 +213,19 @@ class MessageDeduplicator(LoggerMixin):
         })
     
     def cleanup_old_messages(self, max_age_seconds: int = 3600):
-        """Clean up old processed messages to prevent memory leaks."""
-        # This is a simple implementation - in production, you might want to use timestamps
-        # For now, we'll just clear if we have too many messages
-        if len(self.processed_messages) > 10000:
-            # Keep only the most recent 5000 messages
-            recent_messages = list(self.processed_messages)[-5000:]
-            self.processed_messages = set(recent_messages)
-            
-            debug_log(f"🧹 [MessageDeduplicator] Cleaned up old messages", {
-                "remaining_count": len(self.processed_messages)
-            })
+        """Clean up old processed messages to prevent memory leaks.
+        
+        No-op, kept for compatibility: processed IDs live in a fixed-size Bloom filter
+        that resets itself once saturated, and the comm tracker is bounded per shard,
+        so memory is already capped. Entries are not timestamped, so max_age_seconds
+        is ignored.
+        """
     
     def get_stats(self) -> Dict[str, Any]:
         """Get deduplication statistics."""
         return {
             'processed_messages_count': len(self.processed_messages),
-            'comm_trackers_count': len(self.comm_message_tracker),
+            'processed_filter_fill_ratio': self.processed_messages.fill_ratio,
+            'processed_comm_messages_count': len(self.processed_comm_messages),
             'most_recent_comm_messages_count': len(self.most_recent_comm_messages)
         }
@@ -26,8 +26,8 @@ class WebSocketMessageHandler:
             comm_id = msg_info['comm_id']
             parent_msg_id = msg_info['parent_msg_id']
             
-            # Check for duplicate message processing
-            if self.deduplicator.is_duplicate(msg_id, comm_id, kernel_id):
+            # Check for duplicate message processing (and mark it processed if it is new)
+            if self.deduplicator.check_and_mark(msg_id, comm_id, kernel_id, message):
                 debug_log(f"🔄 [WebSocketMessageHandler] Skipping duplicate message", {
                     "kernel_id": kernel_id,
                     "channel": channel,
@@ -36,9 +36,6 @@ class WebSocketMessageHandler:
                 })
                 return None
             
-            # Mark message as processed
-            self.deduplicator.mark_processed(msg_id, comm_id, kernel_id, message)
-            
             # Return processed message info
             return {
                 'msg_type': msg_type,
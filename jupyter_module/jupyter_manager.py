@@ -6,18 +6,17 @@ Coordinates kernel, session, and WebSocket management.
 import asyncio
 import json
 import datetime
+from types import MappingProxyType
 from typing import Optional, Dict, Any, Callable
 
-# Use absolute imports to avoid relative import issues
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 from core.logging import LoggerMixin, debug_log
 from core.config import ServerConfig
 from .kernel_manager import KernelManager
 from .session_manager import SessionManager
 
+# Shared read-only fallback for messages without a header
+_EMPTY = MappingProxyType({})
+
 
 class JupyterManager(LoggerMixin):
     """Unified manager for Jupyter integration."""
@@ -90,11 +89,12 @@ class JupyterManager(LoggerMixin):
         try:
             # Parse message
             msg = json.loads(message)
-            msg_type = msg.get('header', {}).get('msg_type', 'unknown')
+            header = msg.get('header') or _EMPTY
+            msg_type = header.get('msg_type', 'unknown')
             
             debug_log(f"📥 [Jupyter] Kernel message received", {
                 "msg_type": msg_type,
-                "msg_id": msg.get('header', {}).get('msg_id', 'unknown')
+                "msg_id": header.get('msg_id', 'unknown')
             })
             
             print(f"📥 [Jupyter] Kernel message: {msg_type}")
@@ -125,8 +125,9 @@ class JupyterManager(LoggerMixin):
         
         try:
             # Extract message details
-            msg_type = message.get('header', {}).get('msg_type', 'unknown')
-            msg_id = message.get('header', {}).get('msg_id', 'unknown')
+            header = message.get('header') or _EMPTY
+            msg_type = header.get('msg_type', 'unknown')
+            msg_id = header.get('msg_id', 'unknown')
             
             debug_log(f"📤 [Jupyter] Sending kernel message via WebSocket bridge", {
                 "msg_type": msg_type,
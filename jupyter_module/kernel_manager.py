@@ -9,13 +9,9 @@ import datetime
 from typing import Optional, Dict, Any, Callable
 from websockets.client import connect
 
-# Use absolute imports to avoid relative import issues
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 from core.logging import LoggerMixin, debug_log
 from core.config import ServerConfig
+from core.jupyter_message_factory import JupyterMessageFactory
 
 
 class KernelManager(LoggerMixin):
@@ -325,7 +321,7 @@ class KernelManager(LoggerMixin):
             if not self.response_queue.empty():
                 msg = await self.response_queue.get()
                 
-                if (msg.get('parent_header', {}).get('msg_id') == msg_id and 
+                if (JupyterMessageFactory.dig(msg, 'parent_header', 'msg_id') == msg_id and 
                     msg.get('msg_type') == 'execute_reply'):
                     execution_count = msg['content'].get('execution_count')
                     self.execution_count = execution_count
@@ -347,8 +343,8 @@ class KernelManager(LoggerMixin):
         await self.kernel_ws.send(json.dumps(message))
         
         debug_log(f"📤 [Kernel] Message sent to kernel", {
-            "msg_type": message.get('header', {}).get('msg_type', 'unknown'),
-            "msg_id": message.get('header', {}).get('msg_id', 'unknown')
+            "msg_type": JupyterMessageFactory.dig(message, 'header', 'msg_type', 'unknown'),
+            "msg_id": JupyterMessageFactory.dig(message, 'header', 'msg_id', 'unknown')
         })
     
     async def restart_kernel(self):
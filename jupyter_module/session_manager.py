@@ -9,11 +9,6 @@ import datetime
 from typing import Optional, Dict, Any, List
 import requests
 
-# Use absolute imports to avoid relative import issues
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 from core.logging import LoggerMixin, debug_log
 from core.config import ServerConfig
 
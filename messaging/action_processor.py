@@ -3,25 +3,103 @@ Action processor for TensorDock server.
 Handles specific action types and integrates with other modules.
 """
 
+import array
 import asyncio
+import binascii
 import json
+import time
 import datetime
 from typing import Dict, Any, Optional, Callable
 
-# Use absolute imports to avoid relative import issues
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import fastjsonschema
 
-from core.logging import LoggerMixin, debug_log
+# Imports resolve against the server root (the entry scripts live there)
+from core.logging import LoggerMixin, debug_log, DEBUG_ENABLED
 from core.message_deduplicator import MessageDeduplicator
 from core.jupyter_message_factory import JupyterMessageFactory
 from core.validation_utils import ValidationUtils
 
 
+_DOCUMENT_ID_SCHEMA = {'type': 'string', 'minLength': 1}
+
+# Compiled once at import time - each YJS message costs a single generated validator call
+YJS_ACTION_VALIDATORS = {
+    'yjs_document_update': fastjsonschema.compile({
+        'type': 'object',
+        'required': ['documentId', 'update'],
+        'properties': {
+            'documentId': _DOCUMENT_ID_SCHEMA,
+            'update': {'type': ['string', 'array'], 'minLength': 1, 'minItems': 1}
+        }
+    }),
+    'yjs_awareness_update': fastjsonschema.compile({
+        'type': 'object',
+        'required': ['documentId'],
+        'properties': {
+            'documentId': _DOCUMENT_ID_SCHEMA
+        }
+    }),
+    'yjs_sync_request': fastjsonschema.compile({
+        'type': 'object',
+        'required': ['documentId'],
+        'properties': {
+            'documentId': _DOCUMENT_ID_SCHEMA
+        }
+    }),
+    'yjs_request_state': fastjsonschema.compile({
+        'type': 'object',
+        'required': ['documentId'],
+        'properties': {
+            'documentId': _DOCUMENT_ID_SCHEMA
+        }
+    }),
+    'yjs_state_response': fastjsonschema.compile({
+        'type': 'object',
+        'required': ['documentId', 'notebookContent'],
+        'properties': {
+            'documentId': _DOCUMENT_ID_SCHEMA,
+            'notebookContent': {'type': 'object', 'minProperties': 1}
+        }
+    })
+}
+
+
+# Bound once so per-message timestamps skip the module/class attribute walk
+_now = datetime.datetime.now
+
+# Flat counter slots for known action types; anything else is tallied by name
+ACTION_TYPES = (
+    'sudo_http_request', 'canvas_data',
+    'ws_connect', 'ws_message', 'ws_close',
+    'yjs_document_update', 'yjs_awareness_update', 'yjs_sync_request',
+    'yjs_request_state', 'yjs_state_response'
+)
+ACTION_IDX = {name: idx for idx, name in enumerate(ACTION_TYPES)}
+
+
+def _decode_yjs_payload(payload) -> bytes:
+    """Decode a YJS binary payload sent as base64 text (or a legacy list of ints)."""
+    if isinstance(payload, str):
+        return binascii.a2b_base64(payload)
+    return bytes(payload)
+
+
 class ActionProcessor(LoggerMixin):
     """Processes specific action types and integrates with other modules."""
     
+    # Fixed attribute layout - hot handlers read these on every message
+    __slots__ = (
+        'jupyter_manager', 'broadcast_callback', 'send_to_client',
+        'http_proxy_service', 'canvas_service', 'widget_service',
+        'websocket_bridge', 'peer_manager', 'yjs_service',
+        'action_handlers', '_handlers_view', '_handler_count', 'deduplicator',
+        '_action_counts', '_other_action_counts', '_total_actions',
+        '_successful_actions', '_failed_actions', '_start_monotonic', '_start_wall',
+        '_inflight', '_state_response_seen', 'state_response_window',
+        '_http_log_counter', '_mouse_log_counter',
+        '_cached_ts', '_ts_task'
+    )
+    
     def __init__(self):
         # External module references (to be set by server)
         self.jupyter_manager = None
@@ -32,22 +110,40 @@ class ActionProcessor(LoggerMixin):
         self.widget_service = None
         self.websocket_bridge = None
         self.peer_manager = None
+        self.yjs_service = None
         
         # Action handlers
         self.action_handlers: Dict[str, Callable] = {}
+        self._handlers_view = ()  # Snapshot of registered action names, rebuilt on (un)register
+        self._handler_count = 0
         
-        # Action statistics
-        self.action_stats = {
-            'total_actions': 0,
-            'actions_by_type': {},
-            'successful_actions': 0,
-            'failed_actions': 0,
-            'start_time': datetime.datetime.now()
-        }
+        # Action statistics (flat counters; get_status() builds the dict view)
+        self._action_counts = array.array('Q', bytes(8 * len(ACTION_TYPES)))
+        self._other_action_counts: Dict[str, int] = {}
+        self._total_actions = 0
+        self._successful_actions = 0
+        self._failed_actions = 0
+        self._start_monotonic = time.monotonic()
+        self._start_wall = _now().isoformat()
         
         # Centralized message deduplication
         self.deduplicator = MessageDeduplicator()
         
+        # Fire-and-forget service tasks (strong refs so they are not GC'd mid-flight)
+        self._inflight = set()
+        
+        # Log sampling counters for high-rate actions
+        self._http_log_counter = 0
+        self._mouse_log_counter = 0
+        
+        # Coarse ISO timestamp for logs/responses, refreshed by a background ticker
+        self._cached_ts = _now().isoformat()
+        self._ts_task = None
+        
+        # YJS state response deduplication (first response per document wins)
+        self._state_response_seen: Dict[str, float] = {}  # doc_id -> monotonic time accepted
+        self.state_response_window = 2.0  # seconds to ignore repeat responses
+        
         # Register default handlers
         self._register_default_handlers()
         
@@ -111,63 +207,82 @@ class ActionProcessor(LoggerMixin):
         self.register_handler('ws_close', self._handle_websocket_close)
         
         debug_log(f"➕ [ActionProcessor] Default handlers registered", {
-            "total_handlers": len(self.action_handlers)
+            "total_handlers": self._handler_count
         })
     
     def register_handler(self, action: str, handler: Callable):
         """Register a handler for a specific action."""
         self.action_handlers[action] = handler
+        self._handlers_view = tuple(self.action_handlers)
+        self._handler_count = len(self._handlers_view)
         
         debug_log(f"➕ [ActionProcessor] Action handler registered", {
             "action": action,
             "handler": handler.__name__,
-            "total_handlers": len(self.action_handlers)
+            "total_handlers": self._handler_count
         })
     
     def unregister_handler(self, action: str):
         """Unregister an action handler."""
         if action in self.action_handlers:
             del self.action_handlers[action]
+            self._handlers_view = tuple(self.action_handlers)
+            self._handler_count = len(self._handlers_view)
             
             debug_log(f"➖ [ActionProcessor] Action handler unregistered", {
                 "action": action,
-                "total_handlers": len(self.action_handlers)
+                "total_handlers": self._handler_count
             })
     
+    async def _refresh_timestamp(self):
+        """Refresh the cached timestamp string every 50ms."""
+        while True:
+            self._cached_ts = _now().isoformat()
+            await asyncio.sleep(0.05)
+    
     async def process_action(self, action: Dict[str, Any]) -> bool:
         """Process a single action."""
         try:
             action_type = action.get('action', 'unknown')
             
-            debug_log(f"⚙️ [ActionProcessor] Processing action", {
-                "action": action_type,
-                "action_keys": list(action.keys()),
-                "timestamp": datetime.datetime.now().isoformat()
-            })
+            if self._ts_task is None:
+                self._ts_task = asyncio.create_task(self._refresh_timestamp())
+            
+            if DEBUG_ENABLED:
+                debug_log(f"⚙️ [ActionProcessor] Processing action", {
+                    "action": action_type,
+                    "action_keys": list(action.keys()),
+                    "timestamp": self._cached_ts
+                })
             
             # Update statistics
-            self.action_stats['total_actions'] += 1
-            self.action_stats['actions_by_type'][action_type] = self.action_stats['actions_by_type'].get(action_type, 0) + 1
+            self._total_actions += 1
+            idx = ACTION_IDX.get(action_type, -1)
+            if idx >= 0:
+                self._action_counts[idx] += 1
+            else:
+                other = self._other_action_counts
+                other[action_type] = other.get(action_type, 0) + 1
             
             # Check if we have a handler for this action
-            if action_type in self.action_handlers:
-                handler = self.action_handlers[action_type]
-                
+            handler = self.action_handlers.get(action_type)
+            if handler is not None:
                 try:
                     # Execute handler
                     result = await handler(action)
                     
-                    self.action_stats['successful_actions'] += 1
+                    self._successful_actions += 1
                     
-                    debug_log(f"✅ [ActionProcessor] Action processed successfully", {
-                        "action": action_type,
-                        "result": result
-                    })
+                    if DEBUG_ENABLED:
+                        debug_log(f"✅ [ActionProcessor] Action processed successfully", {
+                            "action": action_type,
+                            "result": result
+                        })
                     
                     return True
                     
                 except Exception as e:
-                    self.action_stats['failed_actions'] += 1
+                    self._failed_actions += 1
                     
                     debug_log(f"❌ [ActionProcessor] Action handler error", {
                         "action": action_type,
@@ -177,17 +292,17 @@ class ActionProcessor(LoggerMixin):
                     
                     return False
             else:
-                self.action_stats['failed_actions'] += 1
+                self._failed_actions += 1
                 
                 debug_log(f"❌ [ActionProcessor] No handler for action", {
                     "action": action_type,
-                    "available_handlers": list(self.action_handlers.keys())
+                    "available_handlers": self._handlers_view
                 })
                 
                 return False
                 
         except Exception as e:
-            self.action_stats['failed_actions'] += 1
+            self._failed_actions += 1
             
             debug_log(f"❌ [ActionProcessor] Action processing error", {
                 "error": str(e),
@@ -200,67 +315,44 @@ class ActionProcessor(LoggerMixin):
     
     async def _handle_sudo_http_request(self, action: Dict[str, Any]) -> bool:
         """Handle sudo HTTP request action."""
-        try:
-            # Validate HTTP proxy service
-            error = ValidationUtils.validate_websocket_connection(self.http_proxy_service, "sudo_http_request")
-            if error:
-                raise Exception(error)
-            
-            url = action.get('url')
-            method = action.get('method')
-            
+        # Validate HTTP proxy service
+        error = ValidationUtils.validate_websocket_connection(self.http_proxy_service, "sudo_http_request")
+        if error is None:
             # Validate HTTP request parameters
-            error = ValidationUtils.validate_http_request(url, method)
-            if error:
-                raise ValueError(error)
-            
-            body = action.get('data', {})
-            headers = action.get('headers', {})
-            msg_id = action.get('msgId')
-            client_id = action.get('client_id')
-            
-            # Reduce logging for frequent HTTP requests
-            if hasattr(self, '_http_log_counter'):
-                self._http_log_counter += 1
-                if self._http_log_counter % 10 == 0:  # Log every 10th HTTP request
-                    debug_log(f"🌐 [ActionProcessor] Sudo HTTP request", {
-                        "url": url,
-                        "method": method,
-                        "body_type": type(body).__name__,
-                        "body_keys": list(body.keys()) if isinstance(body, dict) else None,
-                        "body_preview": str(body)[:100] if body else None,
-                        "body_is_string": isinstance(body, str),
-                        "body_is_dict": isinstance(body, dict),
-                        "body_is_none": body is None,
-                        "headers": headers,
-                        "msg_id": msg_id,
-                        "client_id": client_id,
-                        "count": self._http_log_counter
-                    })
-            else:
-                # Initialize counter
-                self._http_log_counter = 0
-                debug_log(f"🌐 [ActionProcessor] Sudo HTTP request", {
-                    "url": url,
-                    "method": method,
-                    "body_type": type(body).__name__,
-                    "body_keys": list(body.keys()) if isinstance(body, dict) else None,
-                    "body_preview": str(body)[:100] if body else None,
-                    "body_is_string": isinstance(body, str),
-                    "body_is_dict": isinstance(body, dict),
-                    "body_is_none": body is None,
-                    "headers": headers,
-                    "msg_id": msg_id,
-                    "client_id": client_id
-                })
-            
-            if not url or not method:
-                debug_log(f"❌ [ActionProcessor] Missing URL or method", {
-                    "url": url,
-                    "method": method
-                })
-                return False
-            
+            error = ValidationUtils.validate_http_request(action.get('url'), action.get('method'))
+        if error:
+            debug_log(f"❌ [ActionProcessor] Error handling sudo HTTP request", {
+                "error": error
+            })
+            return False
+        
+        url = action['url']
+        method = action['method']
+        body = action.get('data', {})
+        headers = action.get('headers', {})
+        msg_id = action.get('msgId')
+        client_id = action.get('client_id')
+        
+        # Reduce logging for frequent HTTP requests (first, then every 16th)
+        http_count = self._http_log_counter
+        self._http_log_counter = http_count + 1
+        if DEBUG_ENABLED and not (http_count & 15):
+            debug_log(f"🌐 [ActionProcessor] Sudo HTTP request", {
+                "url": url,
+                "method": method,
+                "body_type": type(body).__name__,
+                "body_keys": list(body.keys()) if isinstance(body, dict) else None,
+                "body_preview": str(body)[:100] if body else None,
+                "body_is_string": isinstance(body, str),
+                "body_is_dict": isinstance(body, dict),
+                "body_is_none": body is None,
+                "headers": headers,
+                "msg_id": msg_id,
+                "client_id": client_id,
+                "count": self._http_log_counter
+            })
+        
+        try:
             # Process the HTTP request
             result = await self.http_proxy_service.sudo_http_request(url, method, body, headers)
             
@@ -273,77 +365,79 @@ class ActionProcessor(LoggerMixin):
                     'data': result.get('data', {}),
                     'status': result.get('status', 500),
                     'headers': result.get('headers', {}),
-                    'timestamp': datetime.datetime.now().isoformat()
+                    'timestamp': self._cached_ts
                 }
                 
-                # Send response to the specific client
+                # Send response to the specific client. This stays on the loop thread:
+                # RTCDataChannel.send only queues the frame and schedules the flush on
+                # the running loop, and aiortc channels are not thread-safe.
                 success = self.peer_manager.send_message(client_id, response_data)
                 
                 if success:
-                    debug_log(f"✅ [ActionProcessor] Response sent to client", {
-                        "client_id": client_id,
-                        "action": msg_id,
-                        "status": result.get('status')
-                    })
+                    if DEBUG_ENABLED:
+                        debug_log(f"✅ [ActionProcessor] Response sent to client", {
+                            "client_id": client_id,
+                            "action": msg_id,
+                            "status": result.get('status')
+                        })
                 else:
                     debug_log(f"❌ [ActionProcessor] Failed to send response to client", {
                         "client_id": client_id,
                         "action": msg_id
                     })
-            
-            return result
         except Exception as e:
             debug_log(f"❌ [ActionProcessor] Error handling sudo HTTP request", {
                 "error": str(e),
                 "error_type": type(e).__name__
             })
             return False
+        
+        return result
     
     async def _handle_canvas_data(self, action: Dict[str, Any]) -> bool:
         """Handle canvas data action."""
-        try:
-            data = action.get('data', {})
-            data_type = data.get('type', 'unknown')
-            data_id = data.get('id')
-            client_id = action.get('client_id')
-            
-            # Reduce logging for canvas data
-            if data_type == 'mouse' and hasattr(self, '_mouse_log_counter'):
-                self._mouse_log_counter += 1
-                if self._mouse_log_counter % 50 == 0:  # Log every 50th mouse event
-                    debug_log(f"🎨 [ActionProcessor] Canvas data", {
-                        "data_type": data_type,
-                        "data_id": data_id,
-                        "client_id": client_id,
-                        "count": self._mouse_log_counter
-                    })
-            else:
-                # Initialize counter for non-mouse events
-                if not hasattr(self, '_mouse_log_counter'):
-                    self._mouse_log_counter = 0
-                debug_log(f"🎨 [ActionProcessor] Canvas data", {
-                    "data_type": data_type,
-                    "data_id": data_id,
-                    "client_id": client_id
-                })
-            
+        data = action.get('data')
+        if data is None:
             return True
-        except Exception as e:
+        if not isinstance(data, dict):
             debug_log(f"❌ [ActionProcessor] Error handling canvas data", {
-                "error": str(e),
-                "error_type": type(e).__name__
+                "error": "canvas data must be an object",
+                "error_type": type(data).__name__
             })
             return False
+        data_type = data.get('type', 'unknown')
+        
+        # Mouse events are the flood case: count them and bail out unless
+        # this is a sampled (every 64th) event that will actually be logged
+        if data_type == 'mouse':
+            count = self._mouse_log_counter + 1
+            self._mouse_log_counter = count
+            if not DEBUG_ENABLED or count & 63:
+                return True
+            debug_log(f"🎨 [ActionProcessor] Canvas data", {
+                "data_type": data_type,
+                "data_id": data.get('id'),
+                "client_id": action.get('client_id'),
+                "count": count
+            })
+        elif DEBUG_ENABLED:
+            debug_log(f"🎨 [ActionProcessor] Canvas data", {
+                "data_type": data_type,
+                "data_id": data.get('id'),
+                "client_id": action.get('client_id')
+            })
+        
+        return True
     
     async def _handle_websocket_connect(self, action: Dict[str, Any]):
         """Handle WebSocket connection request from frontend."""
-        debug_log(f"🔌 [ActionProcessor] WebSocket connect request received", {
-            "action": action,
-            "has_websocket_bridge": hasattr(self, 'websocket_bridge'),
-            "websocket_bridge_available": bool(self.websocket_bridge) if hasattr(self, 'websocket_bridge') else False
-        })
+        if DEBUG_ENABLED:
+            debug_log(f"🔌 [ActionProcessor] WebSocket connect request received", {
+                "action": action,
+                "websocket_bridge_available": self.websocket_bridge is not None
+            })
         
-        if not hasattr(self, 'websocket_bridge') or not self.websocket_bridge:
+        if self.websocket_bridge is None:
             debug_log(f"❌ [ActionProcessor] WebSocket bridge service not available")
             raise Exception("WebSocket bridge service not available")
         
@@ -352,11 +446,12 @@ class ActionProcessor(LoggerMixin):
         url = action.get('url')
         client_id = action.get('client_id')
         
-        debug_log(f"🔌 [ActionProcessor] WebSocket connect request", {
-            "instance_id": instance_id,
-            "url": url,
-            "client_id": client_id
-        })
+        if DEBUG_ENABLED:
+            debug_log(f"🔌 [ActionProcessor] WebSocket connect request", {
+                "instance_id": instance_id,
+                "url": url,
+                "client_id": client_id
+            })
         
         if not instance_id or not url:
             debug_log(f"❌ [ActionProcessor] Missing required fields for WebSocket connect", {
@@ -369,34 +464,41 @@ class ActionProcessor(LoggerMixin):
             
             success = await self.websocket_bridge.connect_websocket(instance_id, url)
             
-            debug_log(f"🔌 [ActionProcessor] connect_kernel result", {
-                "success": success,
-                "instance_id": instance_id,
-            })
-            
-            if success:
-                debug_log(f"✅ [ActionProcessor] WebSocket connection established", {
+            if DEBUG_ENABLED:
+                debug_log(f"🔌 [ActionProcessor] connect_kernel result", {
+                    "success": success,
                     "instance_id": instance_id,
-                    "url": url
                 })
+            
+            if success:
+                if DEBUG_ENABLED:
+                    debug_log(f"✅ [ActionProcessor] WebSocket connection established", {
+                        "instance_id": instance_id,
+                        "url": url
+                    })
                 
                 # Send confirmation to frontend
                 if self.broadcast_callback:
                     confirmation_message = {
                         'action': 'ws_connected',
                         'instanceId': instance_id,
-                        'timestamp': datetime.datetime.now().isoformat()
+                        'timestamp': self._cached_ts
                     }
                     
-                    debug_log(f"📤 [ActionProcessor] Sending ws_connected confirmation", {
-                        "message": confirmation_message,
-                        "client_id": client_id
-                    })
+                    if DEBUG_ENABLED:
+                        debug_log(f"📤 [ActionProcessor] Sending ws_connected confirmation", {
+                            "message": confirmation_message,
+                            "client_id": client_id
+                        })
                     
-                    # Send confirmation WITHOUT excluding the client (they need to receive it)
+                    # Send confirmation WITHOUT excluding the client (they need to receive it).
+                    # Sent inline, not via a deferred queue: the bridge starts forwarding
+                    # frames for this instance immediately, and the client must see
+                    # ws_connected before the first of them.
                     await self.broadcast_callback(confirmation_message)
                     
-                    debug_log(f"✅ [ActionProcessor] ws_connected confirmation sent")
+                    if DEBUG_ENABLED:
+                        debug_log(f"✅ [ActionProcessor] ws_connected confirmation sent")
                 else:
                     debug_log(f"⚠️ [ActionProcessor] No broadcast callback available")
                 
@@ -414,13 +516,14 @@ class ActionProcessor(LoggerMixin):
                         'instanceId': instance_id,
                         'url': url,
                         'error': 'WebSocket connection failed',
-                        'timestamp': datetime.datetime.now().isoformat()
+                        'timestamp': self._cached_ts
                     }
                     
-                    debug_log(f"📤 [ActionProcessor] Sending ws_connect_failed notification", {
-                        "message": failure_message,
-                        "client_id": client_id
-                    })
+                    if DEBUG_ENABLED:
+                        debug_log(f"📤 [ActionProcessor] Sending ws_connect_failed notification", {
+                            "message": failure_message,
+                            "client_id": client_id
+                        })
                     
                     await self.broadcast_callback(failure_message)
                 
@@ -443,13 +546,14 @@ class ActionProcessor(LoggerMixin):
                     'kernelId': kernel_id or 'default',
                     'url': url,
                     'error': str(e),
-                    'timestamp': datetime.datetime.now().isoformat()
+                    'timestamp': self._cached_ts
                 }
                 
-                debug_log(f"📤 [ActionProcessor] Sending ws_connect_failed notification (exception)", {
-                    "message": failure_message,
-                    "client_id": client_id
-                })
+                if DEBUG_ENABLED:
+                    debug_log(f"📤 [ActionProcessor] Sending ws_connect_failed notification (exception)", {
+                        "message": failure_message,
+                        "client_id": client_id
+                    })
                 
                 await self.broadcast_callback(failure_message)
             
@@ -457,7 +561,7 @@ class ActionProcessor(LoggerMixin):
     
     async def _handle_websocket_message(self, action: Dict[str, Any]):
         """Handle WebSocket message from frontend."""
-        if not hasattr(self, 'websocket_bridge') or not self.websocket_bridge:
+        if self.websocket_bridge is None:
             raise Exception("WebSocket bridge service not available")
         
         # Handle both camelCase (frontend) and snake_case (backend) field naming
@@ -470,39 +574,39 @@ class ActionProcessor(LoggerMixin):
         # ERROR: This should never happen - all messages should be properly wrapped
         # If we're receiving direct Jupyter messages, there's a bug in the frontend
         if not instance_id and not data and 'header' in action and 'content' in action:
+            msg_type = JupyterMessageFactory.dig(action, 'header', 'msg_type')
+            session = JupyterMessageFactory.dig(action, 'header', 'session')
             debug_log(f"❌ [ActionProcessor] ERROR: Received direct Jupyter message (not wrapped) - this should not happen!", {
                 "has_header": 'header' in action,
                 "has_content": 'content' in action,
-                "msg_type": action.get('header', {}).get('msg_type'),
+                "msg_type": msg_type,
                 "action_keys": list(action.keys()),
                 "action_preview": str(action)[:200],
-                "session": action.get('header', {}).get('session'),
+                "session": session,
                 "client_id": client_id
             })
             
             # Reject this message - it should be properly wrapped by the frontend
             debug_log(f"❌ [ActionProcessor] REJECTING unwrapped Jupyter message - frontend must fix this!", {
-                "msg_type": action.get('header', {}).get('msg_type'),
-                "session": action.get('header', {}).get('session'),
+                "msg_type": msg_type,
+                "session": session,
                 "client_id": client_id,
                 "CRITICAL": "There is a WebSocket connection bypassing our WebRTC system!"
             })
             return False
         
-        debug_log(f"📤 [ActionProcessor] WebSocket message from frontend", {
-            "instance_id": instance_id,
-            "kernel_id": kernel_id,
-            "data_type": type(data).__name__,
-            "data_preview": str(data)[:100] if data else None,
-            "url": url,
-            "client_id": client_id,
-            "action_keys": list(action.keys()),
-            "raw_instanceId": action.get('instanceId'),
-            "raw_instance_id": action.get('instance_id'),
-            "raw_data": action.get('data'),
-            "action_type": type(action).__name__,
-            "action_str_preview": str(action)[:500]
-        })
+        if DEBUG_ENABLED:
+            debug_log(f"📤 [ActionProcessor] WebSocket message from frontend", {
+                "instance_id": instance_id,
+                "kernel_id": kernel_id,
+                "data_type": type(data).__name__,
+                "data_preview": str(data)[:100] if data else None,
+                "url": url,
+                "client_id": client_id,
+                "action_keys": list(action.keys()),
+                "action_type": type(action).__name__,
+                "action_str_preview": str(action)[:500]
+            })
         
         # Enhanced validation - check for both instance_id and data
         if not instance_id:
@@ -523,44 +627,27 @@ class ActionProcessor(LoggerMixin):
             })
             return False
         
+        # Always use URL-based routing; without a URL, infer the kernel or events socket
+        target_url = self._resolve_ws_url(url, kernel_id)
+        
         try:
-            # Always use URL-based routing
-            if url:
-                debug_log(f"🔧 [ActionProcessor] Sending message via URL-based routing", {
+            if DEBUG_ENABLED:
+                debug_log(f"🔧 [ActionProcessor] Sending message via {'URL-based routing' if url else 'inferred URL'}", {
                     "instance_id": instance_id,
-                    "url": url,
+                    "kernel_id": kernel_id,
+                    "url": target_url,
                     "data_type": type(data).__name__,
                     "data_preview": str(data)[:100] if data else None
                 })
-                success = await self.websocket_bridge.send_ws_message_by_url(instance_id, url, data)
-            else:
-                # Try to infer URL from kernel_id
-                if kernel_id and kernel_id != 'events':
-                    # This is likely a kernel message
-                    inferred_url = f"ws://localhost:8888/api/kernels/{kernel_id}/channels"
-                    debug_log(f"🔧 [ActionProcessor] Sending message via inferred kernel URL", {
+            success = await self.websocket_bridge.send_ws_message_by_url(instance_id, target_url, data)
+            
+            if success:
+                if DEBUG_ENABLED:
+                    debug_log(f"✅ [ActionProcessor] WebSocket message sent successfully", {
                         "instance_id": instance_id,
                         "kernel_id": kernel_id,
-                        "inferred_url": inferred_url,
-                        "data_type": type(data).__name__
-                    })
-                    success = await self.websocket_bridge.send_ws_message_by_url(instance_id, inferred_url, data)
-                else:
-                    # This might be an events message
-                    inferred_url = "ws://localhost:8888/api/events/subscribe"
-                    debug_log(f"🔧 [ActionProcessor] Sending message via inferred events URL", {
-                        "instance_id": instance_id,
-                        "inferred_url": inferred_url,
-                        "data_type": type(data).__name__
+                        "url": url or "inferred"
                     })
-                    success = await self.websocket_bridge.send_ws_message_by_url(instance_id, inferred_url, data)
-            
-            if success:
-                debug_log(f"✅ [ActionProcessor] WebSocket message sent successfully", {
-                    "instance_id": instance_id,
-                    "kernel_id": kernel_id,
-                    "url": url or "inferred"
-                })
                 return True
             else:
                 debug_log(f"❌ [ActionProcessor] Failed to send WebSocket message", {
@@ -582,7 +669,7 @@ class ActionProcessor(LoggerMixin):
     
     async def _handle_websocket_close(self, action: Dict[str, Any]):
         """Handle WebSocket close request from frontend."""
-        if not hasattr(self, 'websocket_bridge') or not self.websocket_bridge:
+        if self.websocket_bridge is None:
             raise Exception("WebSocket bridge service not available")
         
         # Handle both camelCase (frontend) and snake_case (backend) field naming
@@ -590,11 +677,12 @@ class ActionProcessor(LoggerMixin):
         kernel_id = action.get('kernelId') or action.get('kernel_id')
         client_id = action.get('client_id')
         
-        debug_log(f"🔌 [ActionProcessor] WebSocket close request", {
-            "instance_id": instance_id,
-            "kernel_id": kernel_id,
-            "client_id": client_id
-        })
+        if DEBUG_ENABLED:
+            debug_log(f"🔌 [ActionProcessor] WebSocket close request", {
+                "instance_id": instance_id,
+                "kernel_id": kernel_id,
+                "client_id": client_id
+            })
         
         if not instance_id:
             debug_log(f"❌ [ActionProcessor] Missing instance_id for WebSocket close", {
@@ -602,26 +690,20 @@ class ActionProcessor(LoggerMixin):
             })
             return False
         
+        # Use URL-based close via WebSocket bridge
+        url = action.get('url')
+        target_url = self._resolve_ws_url(url, kernel_id)
+        
         try:
-            # Use URL-based close via WebSocket bridge
-            url = action.get('url')
-            if url:
-                success = await self.websocket_bridge.ws_close(instance_id, url)
-            else:
-                # Try to infer URL from kernel_id
-                if kernel_id and kernel_id != 'events':
-                    inferred_url = f"ws://localhost:8888/api/kernels/{kernel_id}/channels"
-                    success = await self.websocket_bridge.ws_close(instance_id, inferred_url)
-                else:
-                    inferred_url = "ws://localhost:8888/api/events/subscribe"
-                    success = await self.websocket_bridge.ws_close(instance_id, inferred_url)
+            success = await self.websocket_bridge.ws_close(instance_id, target_url)
             
             if success:
-                debug_log(f"✅ [ActionProcessor] WebSocket connection closed", {
-                    "instance_id": instance_id,
-                    "kernel_id": kernel_id,
-                    "url": url or "inferred"
-                })
+                if DEBUG_ENABLED:
+                    debug_log(f"✅ [ActionProcessor] WebSocket connection closed", {
+                        "instance_id": instance_id,
+                        "kernel_id": kernel_id,
+                        "url": url or "inferred"
+                    })
                 
                 # Send confirmation to frontend
                 if self.broadcast_callback:
@@ -629,7 +711,7 @@ class ActionProcessor(LoggerMixin):
                         'action': 'websocket_closed',
                         'instanceId': instance_id,
                         'kernelId': kernel_id or 'default',
-                        'timestamp': datetime.datetime.now().isoformat()
+                        'timestamp': self._cached_ts
                     })
                 
                 return True
@@ -650,31 +732,47 @@ class ActionProcessor(LoggerMixin):
             })
             return False
     
+    def _resolve_ws_url(self, url: Optional[str], kernel_id: Optional[str]) -> str:
+        """Return the bridge URL for a ws_* action, inferring it from kernel_id if absent."""
+        if url:
+            return url
+        if kernel_id and kernel_id != 'events':
+            # This is likely a kernel message
+            return f"ws://localhost:8888/api/kernels/{kernel_id}/channels"
+        # This might be an events message
+        return "ws://localhost:8888/api/events/subscribe"
+    
     def _build_websocket_url(self, url: str) -> str:
         """Build WebSocket URL from HTTP URL."""
+        # Swap only the scheme prefix; replace() would also rewrite any
+        # http:// appearing later in the URL (e.g. in a query string)
         if url.startswith('http://'):
-            return url.replace('http://', 'ws://')
+            return 'ws://' + url[7:]
         elif url.startswith('https://'):
-            return url.replace('https://', 'wss://')
+            return 'wss://' + url[8:]
         else:
             # Assume localhost if no protocol
             return f"ws://localhost:8888{url}"
     
     def get_status(self) -> Dict[str, Any]:
         """Get action processor status."""
-        uptime = datetime.datetime.now() - self.action_stats['start_time']
-        total = self.action_stats['total_actions']
-        success_rate = (self.action_stats['successful_actions'] / max(total, 1)) * 100
+        total = self._total_actions
+        success_rate = (self._successful_actions / max(total, 1)) * 100
+        
+        actions_by_type = {
+            name: count for name, count in zip(ACTION_TYPES, self._action_counts) if count
+        }
+        actions_by_type.update(self._other_action_counts)
         
         return {
-            'total_handlers': len(self.action_handlers),
+            'total_handlers': self._handler_count,
             'total_actions': total,
-            'successful_actions': self.action_stats['successful_actions'],
-            'failed_actions': self.action_stats['failed_actions'],
+            'successful_actions': self._successful_actions,
+            'failed_actions': self._failed_actions,
             'success_rate': success_rate,
-            'actions_by_type': dict(self.action_stats['actions_by_type']),
-            'uptime_seconds': uptime.total_seconds(),
-            'start_time': self.action_stats['start_time'].isoformat(),
+            'actions_by_type': actions_by_type,
+            'uptime_seconds': time.monotonic() - self._start_monotonic,
+            'start_time': self._start_wall,
             'jupyter_manager_available': self.jupyter_manager is not None,
             'broadcast_callback_available': self.broadcast_callback is not None,
             'http_proxy_service_available': self.http_proxy_service is not None,
@@ -682,53 +780,72 @@ class ActionProcessor(LoggerMixin):
             'widget_service_available': self.widget_service is not None,
             'websocket_bridge_available': self.websocket_bridge is not None,
             'peer_manager_available': self.peer_manager is not None,
-            'available_actions': list(self.action_handlers.keys())
+            'available_actions': list(self._handlers_view)
         }
     
     async def cleanup(self):
         """Clean up action processor resources."""
         debug_log(f"🧹 [ActionProcessor] Cleaning up action processor")
         
+        # Stop timestamp ticker
+        if self._ts_task is not None:
+            self._ts_task.cancel()
+            self._ts_task = None
+        
         # Clear handlers
         self.action_handlers.clear()
+        self._handlers_view = ()
+        self._handler_count = 0
+        
+        # Forget recently accepted state responses
+        self._state_response_seen.clear()
         
         # Clear references
         self.jupyter_manager = None
         self.broadcast_callback = None
+        self.send_to_client = None
         self.http_proxy_service = None
         self.canvas_service = None
         self.widget_service = None
         self.websocket_bridge = None
         self.peer_manager = None
+        self.yjs_service = None
         
         debug_log(f"🧹 [ActionProcessor] Action processor cleanup completed")
 
+    def _validate_yjs_action(self, action_type: str, action: Dict[str, Any]) -> bool:
+        """Validate a YJS action against its precompiled schema."""
+        try:
+            YJS_ACTION_VALIDATORS[action_type](action)
+            return True
+        except fastjsonschema.JsonSchemaException as e:
+            debug_log(f"❌ [ActionProcessor] Invalid {action_type} action", {
+                "error": e.message,
+                "client_id": action.get('client_id') if isinstance(action, dict) else None
+            })
+            return False
+
     async def _handle_yjs_document_update(self, action: Dict[str, Any]):
         """Handle YJS document update from frontend."""
         try:
-            document_id = action.get('documentId')
-            update_data = action.get('update')
+            if not self._validate_yjs_action('yjs_document_update', action):
+                return False
+            
+            document_id = action['documentId']
+            update_data = action['update']
             client_id = action.get('client_id')
             
-            if not document_id or not update_data:
-                debug_log(f"❌ [ActionProcessor] YJS document update missing required fields", {
+            if DEBUG_ENABLED:
+                debug_log(f"📥 [ActionProcessor] YJS document update received", {
                     "document_id": document_id,
-                    "has_update": bool(update_data),
+                    "update_size": len(update_data),
                     "client_id": client_id
                 })
-                return False
-            
-            debug_log(f"📥 [ActionProcessor] YJS document update received", {
-                "document_id": document_id,
-                "update_size": len(update_data) if update_data else 0,
-                "client_id": client_id
-            })
             
-            # Convert array back to bytes
-            update_bytes = bytes(update_data)
+            update_bytes = _decode_yjs_payload(update_data)
             
             # Store the update and broadcast to other clients
-            if hasattr(self, 'yjs_service') and self.yjs_service:
+            if self.yjs_service is not None:
                 await self.yjs_service.handle_document_update(document_id, update_bytes)
             else:
                 debug_log(f"⚠️ [ActionProcessor] YJS service not available", {
@@ -749,36 +866,33 @@ class ActionProcessor(LoggerMixin):
     async def _handle_yjs_awareness_update(self, action: Dict[str, Any]):
         """Handle YJS awareness update from frontend."""
         try:
-            document_id = action.get('documentId')
+            if not self._validate_yjs_action('yjs_awareness_update', action):
+                return False
+            
+            document_id = action['documentId']
             awareness_data = action.get('awareness')
             client_id = action.get('client_id')
             
-            if not document_id:
-                debug_log(f"❌ [ActionProcessor] YJS awareness update missing document ID", {
-                    "document_id": document_id,
-                    "client_id": client_id
-                })
-                return False
-            
             # Skip empty awareness updates - they're normal in YJS protocol
             if not awareness_data or len(awareness_data) == 0:
-                debug_log(f"🔧 [ActionProcessor] Skipping empty YJS awareness update", {
+                if DEBUG_ENABLED:
+                    debug_log(f"🔧 [ActionProcessor] Skipping empty YJS awareness update", {
+                        "document_id": document_id,
+                        "client_id": client_id
+                    })
+                return True
+            
+            if DEBUG_ENABLED:
+                debug_log(f"📥 [ActionProcessor] YJS awareness update received", {
                     "document_id": document_id,
+                    "awareness_size": len(awareness_data),
                     "client_id": client_id
                 })
-                return True
             
-            debug_log(f"📥 [ActionProcessor] YJS awareness update received", {
-                "document_id": document_id,
-                "awareness_size": len(awareness_data),
-                "client_id": client_id
-            })
-            
-            # Convert array back to bytes
-            awareness_bytes = bytes(awareness_data)
+            awareness_bytes = _decode_yjs_payload(awareness_data)
             
             # Store the update and broadcast to other clients
-            if hasattr(self, 'yjs_service') and self.yjs_service:
+            if self.yjs_service is not None:
                 await self.yjs_service.handle_awareness_update(document_id, awareness_bytes)
             else:
                 debug_log(f"⚠️ [ActionProcessor] YJS service not available", {
@@ -799,24 +913,24 @@ class ActionProcessor(LoggerMixin):
     async def _handle_yjs_sync_request(self, action: Dict[str, Any]):
         """Handle YJS sync request from frontend."""
         try:
-            document_id = action.get('documentId')
+            if not self._validate_yjs_action('yjs_sync_request', action):
+                return False
+            
+            document_id = action['documentId']
             client_id = action.get('client_id')
             
-            if not document_id:
-                debug_log(f"❌ [ActionProcessor] YJS sync request missing document ID", {
+            if DEBUG_ENABLED:
+                debug_log(f"📥 [ActionProcessor] YJS sync request received", {
                     "document_id": document_id,
                     "client_id": client_id
                 })
-                return False
-            
-            debug_log(f"📥 [ActionProcessor] YJS sync request received", {
-                "document_id": document_id,
-                "client_id": client_id
-            })
             
-            # Handle the sync request
-            if hasattr(self, 'yjs_service') and self.yjs_service:
-                await self.yjs_service.handle_sync_request(document_id)
+            # Handle the sync request - the service answers via the broadcast callback,
+            # so there is no need to hold the worker until it finishes
+            if self.yjs_service is not None:
+                task = asyncio.create_task(self.yjs_service.handle_sync_request(document_id))
+                self._inflight.add(task)
+                task.add_done_callback(self._inflight.discard)
             else:
                 debug_log(f"⚠️ [ActionProcessor] YJS service not available", {
                     "document_id": document_id,
@@ -836,20 +950,17 @@ class ActionProcessor(LoggerMixin):
     async def _handle_yjs_request_state(self, action: Dict[str, Any]):
         """Handle YJS state request from backend."""
         try:
-            document_id = action.get('documentId')
+            if not self._validate_yjs_action('yjs_request_state', action):
+                return False
+            
+            document_id = action['documentId']
             client_id = action.get('client_id')
             
-            if not document_id:
-                debug_log(f"❌ [ActionProcessor] YJS state request missing document ID", {
+            if DEBUG_ENABLED:
+                debug_log(f"📥 [ActionProcessor] YJS state request received", {
                     "document_id": document_id,
                     "client_id": client_id
                 })
-                return False
-            
-            debug_log(f"📥 [ActionProcessor] YJS state request received", {
-                "document_id": document_id,
-                "client_id": client_id
-            })
             
             # This will be handled by the frontend YJS provider
             # The frontend will respond with the current document state
@@ -866,24 +977,41 @@ class ActionProcessor(LoggerMixin):
     async def _handle_yjs_state_response(self, action: Dict[str, Any]):
         """Handle YJS state response from frontend."""
         try:
-            document_id = action.get('documentId')
-            notebook_content = action.get('notebookContent')
+            if not self._validate_yjs_action('yjs_state_response', action):
+                return False
+            
+            document_id = action['documentId']
+            notebook_content = action['notebookContent']
             client_id = action.get('client_id')
             
-            if not document_id or not notebook_content:
-                debug_log(f"❌ [ActionProcessor] YJS state response missing required fields", {
+            # Several clients may answer the same state request; only save the first
+            now = time.monotonic()
+            if now - self._state_response_seen.get(document_id, 0.0) < self.state_response_window:
+                if DEBUG_ENABLED:
+                    debug_log(f"🔄 [ActionProcessor] Duplicate YJS state response ignored", {
+                        "document_id": document_id,
+                        "client_id": client_id
+                    })
+                return True
+            # Re-insert so the dict stays ordered by acceptance time, then drop the
+            # entries whose window has passed (oldest first) so it doesn't grow forever
+            seen = self._state_response_seen
+            seen.pop(document_id, None)
+            seen[document_id] = now
+            cutoff = now - self.state_response_window
+            while seen:
+                oldest = next(iter(seen))
+                if seen[oldest] >= cutoff:
+                    break
+                del seen[oldest]
+            
+            if DEBUG_ENABLED:
+                debug_log(f"📥 [ActionProcessor] YJS state response received", {
                     "document_id": document_id,
-                    "has_content": bool(notebook_content),
                     "client_id": client_id
                 })
-                return False
-            
-            debug_log(f"📥 [ActionProcessor] YJS state response received", {
-                "document_id": document_id,
-                "client_id": client_id
-            })
             
-            if hasattr(self, 'yjs_service') and self.yjs_service:
+            if self.yjs_service is not None:
                 await self.yjs_service.handle_document_state_response(document_id, notebook_content)
             else:
                 debug_log(f"⚠️ [ActionProcessor] YJS service not available", {
@@ -4,30 +4,48 @@ Handles message routing, queuing, and distribution to appropriate handlers.
 """
 
 import asyncio
+import bisect
 import json
+import sys
+import time
 import datetime
-from typing import Dict, Any, Callable, Optional, List
+from typing import Dict, Any, Callable, Optional, List, Tuple
 from collections import defaultdict
 
-# Use absolute imports to avoid relative import issues
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Imports resolve against the server root (the entry scripts live there)
+from core.logging import LoggerMixin, debug_log, DEBUG_ENABLED
 
-from core.logging import LoggerMixin, debug_log
+
+def _drain_queue(queue: asyncio.Queue):
+    """Discard everything pending in an asyncio.Queue and mark it all done."""
+    while True:
+        try:
+            queue.get_nowait()
+        except asyncio.QueueEmpty:
+            break
+        queue.task_done()
 
 
 class MessageBroker(LoggerMixin):
     """Routes and distributes messages to appropriate handlers."""
     
     def __init__(self):
-        # Message queues
-        self.action_queue = asyncio.Queue()
-        self.input_queue = asyncio.Queue()
-        self.response_queue = asyncio.Queue()
+        # Message queues (bounded so a stuck consumer cannot grow them without limit)
+        self.max_queue_size = 10000
+        self.action_queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self.input_queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self.response_queue = asyncio.Queue(maxsize=self.max_queue_size)
         
-        # Message handlers by action type
+        # Message handlers by action type: (priority, handler) pairs, highest priority first
         self.action_handlers: Dict[str, List[Callable]] = defaultdict(list)
+        # Combined dispatch table: action -> (submit to workers?, handlers without priorities).
+        # Rebuilt whenever handlers or routing rules change; unknown actions go to the workers.
+        self._routes: Dict[str, Tuple[bool, tuple]] = {}
+        
+        # Per-handler queues and consumer tasks for actions with several handlers
+        # (built lazily on first dispatch, dropped whenever the handler set changes)
+        self._handler_queues: Dict[str, List[asyncio.Queue]] = {}
+        self._handler_tasks: Dict[str, List[asyncio.Task]] = {}
         
         # Message routing rules
         self.routing_rules: Dict[str, str] = {}
@@ -38,11 +56,14 @@ class MessageBroker(LoggerMixin):
         # Message statistics
         self.message_stats = {
             'total_messages': 0,
-            'messages_by_action': defaultdict(int),
-            'messages_by_handler': defaultdict(int),
+            'messages_by_action': {},
             'errors': 0,
-            'start_time': datetime.datetime.now()
+            'dropped': 0
         }
+        # Direct reference for the per-message counter update
+        self._count_by_action: Dict[str, int] = self.message_stats['messages_by_action']
+        self._start_monotonic = time.monotonic()
+        self._start_wall_iso = datetime.datetime.now().isoformat()
         
         # Broker state
         self.running = False
@@ -58,10 +79,12 @@ class MessageBroker(LoggerMixin):
     
     def register_handler(self, action: str, handler: Callable, priority: int = 0):
         """Register a handler for a specific action type."""
-        self.action_handlers[action].append((priority, handler))
-        
-        # Sort handlers by priority (higher priority first)
-        self.action_handlers[action].sort(key=lambda x: x[0], reverse=True)
+        action = sys.intern(action)
+        # Insert after existing handlers of equal priority (higher priority first)
+        handlers = self.action_handlers[action]
+        bisect.insort_right(handlers, (priority, handler), key=lambda x: -x[0])
+        self._rebuild_route(action)
+        self._drop_handler_loops(action)
         
         debug_log(f"➕ [MessageBroker] Handler registered", {
             "action": action,
@@ -76,6 +99,8 @@ class MessageBroker(LoggerMixin):
             # Remove handler by finding and removing the tuple
             handlers = self.action_handlers[action]
             handlers[:] = [(p, h) for p, h in handlers if h != handler]
+            self._rebuild_route(action)
+            self._drop_handler_loops(action)
             
             debug_log(f"➖ [MessageBroker] Handler unregistered", {
                 "action": action,
@@ -85,46 +110,42 @@ class MessageBroker(LoggerMixin):
     
     def add_routing_rule(self, action: str, target_queue: str):
         """Add a routing rule for message distribution."""
+        action = sys.intern(action)
         self.routing_rules[action] = target_queue
+        self._rebuild_route(action)
         
         debug_log(f"🛣️ [MessageBroker] Routing rule added", {
             "action": action,
             "target_queue": target_queue
         })
     
-    async def route_message(self, message: Dict[str, Any]) -> bool:
-        """Route a message to the appropriate queue and handlers."""
+    def route_message(self, message: Dict[str, Any]) -> bool:
+        """Route a message; the background processor delivers it to workers and handlers."""
         try:
             action = message.get('action', 'unknown')
             
-            debug_log(f"📨 [MessageBroker] Routing message", {
-                "action": action,
-                "message_keys": list(message.keys()),
-                "timestamp": datetime.datetime.now().isoformat()
-            })
+            if DEBUG_ENABLED:
+                debug_log(f"📨 [MessageBroker] Routing message", {
+                    "action": action,
+                    "message_keys": list(message.keys())
+                })
             
             # Update statistics
             self.message_stats['total_messages'] += 1
-            self.message_stats['messages_by_action'][action] += 1
-            
-            # Route to appropriate queue based on action type
-            if action in self.routing_rules:
-                target_queue = self.routing_rules[action]
-                if target_queue == 'action':
-                    await self.action_queue.put(message)
-                    # Also submit to worker manager for processing
-                    if self.worker_manager:
-                        await self.worker_manager.submit_task(action, message)
+            counts = self._count_by_action
+            counts[action] = counts.get(action, 0) + 1
             
-            else:
-                # Unknown action, put in action queue for processing
-                await self.action_queue.put(message)
-                # Also submit to worker manager for processing
-                if self.worker_manager:
-                    await self.worker_manager.submit_task(action, message)
-            
-            # Notify handlers
-            await self._notify_handlers(action, message)
+            # Never suspends; when the queue is full the message is dropped
+            try:
+                self.action_queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self.message_stats['dropped'] += 1
+                debug_log(f"⚠️ [MessageBroker] Action queue full, message dropped", {
+                    "action": action,
+                    "max_queue_size": self.max_queue_size,
+                    "dropped": self.message_stats['dropped']
+                })
+                return False
             
             return True
             
@@ -137,68 +158,111 @@ class MessageBroker(LoggerMixin):
             })
             return False
     
-    async def _notify_handlers(self, action: str, message: Dict[str, Any]):
+    def _rebuild_route(self, action: str):
+        """Refresh the dispatch table entry for one action."""
+        handlers = self.action_handlers.get(action, ())
+        self._routes[action] = (
+            self.routing_rules.get(action, 'action') == 'action',
+            tuple(h for _, h in handlers)
+        )
+    
+    async def _notify_handlers(self, action: str, message: Dict[str, Any], handlers: tuple):
         """Notify all registered handlers for an action."""
-        if action in self.action_handlers:
-            handlers = self.action_handlers[action]
-            
-            debug_log(f"🔔 [MessageBroker] Notifying handlers", {
+        # Common case: one handler, run it inline without a Task
+        if len(handlers) == 1:
+            handler = handlers[0]
+            try:
+                await handler(message)
+            except Exception as e:
+                debug_log(f"❌ [MessageBroker] Handler execution error", {
+                    "action": action,
+                    "handler": handler.__name__,
+                    "error": str(e),
+                    "error_type": type(e).__name__
+                })
+            return
+        
+        # Several handlers: hand the message to each handler's long-lived consumer
+        queues = self._handler_queues.get(action)
+        if queues is None:
+            queues = self._start_handler_loops(action, handlers)
+        for queue, handler in zip(queues, handlers):
+            # Bounded like the action queue: a slow handler loses messages rather than growing memory
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self.message_stats['dropped'] += 1
+                debug_log(f"⚠️ [MessageBroker] Handler queue full, message dropped", {
+                    "action": action,
+                    "handler": handler.__name__,
+                    "max_queue_size": self.max_queue_size,
+                    "dropped": self.message_stats['dropped']
+                })
+        
+        if DEBUG_ENABLED:
+            debug_log(f"🔔 [MessageBroker] Message queued for handlers", {
                 "action": action,
-                "handler_count": len(handlers)
+                "handler_count": len(queues)
             })
-            
-            # Create tasks for all handlers
-            tasks = []
-            for priority, handler in handlers:
-                try:
-                    task = asyncio.create_task(handler(message))
-                    tasks.append(task)
-                    
-                    debug_log(f"🔔 [MessageBroker] Handler task created", {
-                        "action": action,
-                        "handler": handler.__name__,
-                        "priority": priority
-                    })
-                    
-                except Exception as e:
-                    debug_log(f"❌ [MessageBroker] Handler task creation error", {
-                        "action": action,
-                        "handler": handler.__name__,
-                        "error": str(e),
-                        "error_type": type(e).__name__
-                    })
-            
-            # Wait for all handlers to complete
-            if tasks:
-                try:
-                    await asyncio.gather(*tasks, return_exceptions=True)
-                    
-                    debug_log(f"✅ [MessageBroker] All handlers completed", {
-                        "action": action,
-                        "handler_count": len(tasks)
-                    })
-                    
-                except Exception as e:
-                    debug_log(f"❌ [MessageBroker] Handler execution error", {
-                        "action": action,
-                        "error": str(e),
-                        "error_type": type(e).__name__
-                    })
+    
+    def _start_handler_loops(self, action: str, handlers: tuple) -> List[asyncio.Queue]:
+        """Create one queue and consumer task per handler of an action."""
+        queues = []
+        tasks = []
+        for handler in handlers:
+            queue = asyncio.Queue(maxsize=self.max_queue_size)
+            queues.append(queue)
+            tasks.append(asyncio.create_task(self._handler_loop(action, handler, queue)))
+        
+        self._handler_queues[action] = queues
+        self._handler_tasks[action] = tasks
+        
+        debug_log(f"🔔 [MessageBroker] Handler consumers started", {
+            "action": action,
+            "handler_count": len(tasks)
+        })
+        return queues
+    
+    def _drop_handler_loops(self, action: str):
+        """Stop the consumers for an action so they are rebuilt from the current handlers."""
+        self._handler_queues.pop(action, None)
+        for task in self._handler_tasks.pop(action, ()):
+            task.cancel()
+    
+    async def _handler_loop(self, action: str, handler: Callable, queue: asyncio.Queue):
+        """Feed queued messages to a single handler, one at a time."""
+        while True:
+            message = await queue.get()
+            try:
+                await handler(message)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                debug_log(f"❌ [MessageBroker] Handler execution error", {
+                    "action": action,
+                    "handler": handler.__name__,
+                    "error": str(e),
+                    "error_type": type(e).__name__
+                })
+            finally:
+                queue.task_done()
     
     async def broadcast_message(self, message: Dict[str, Any], exclude_client_id: Optional[str] = None):
         """Broadcast a message to all connected clients."""
         try:
-            debug_log(f"📤 [MessageBroker] Broadcasting message", {
-                "action": message.get('action'),
-                "exclude_client_id": exclude_client_id
-            })
+            if DEBUG_ENABLED:
+                debug_log(f"📤 [MessageBroker] Broadcasting message", {
+                    "action": message.get('action'),
+                    "exclude_client_id": exclude_client_id
+                })
             
             # This would integrate with the WebRTC broadcast system
             # For now, we'll just log the broadcast
-            debug_log(f"📤 [MessageBroker] Broadcast message logged", {
-                "message": message,
-                "exclude_client_id": exclude_client_id
-            })
+            if DEBUG_ENABLED:
+                debug_log(f"📤 [MessageBroker] Broadcast message logged", {
+                    "message": message,
+                    "exclude_client_id": exclude_client_id
+                })
             
             return True
             
@@ -221,14 +285,14 @@ class MessageBroker(LoggerMixin):
     
     def get_statistics(self) -> Dict[str, Any]:
         """Get message processing statistics."""
-        uptime = datetime.datetime.now() - self.message_stats['start_time']
         
         return {
             'total_messages': self.message_stats['total_messages'],
-            'messages_by_action': dict(self.message_stats['messages_by_action']),
+            'messages_by_action': dict(self._count_by_action),
             'errors': self.message_stats['errors'],
-            'uptime_seconds': uptime.total_seconds(),
-            'start_time': self.message_stats['start_time'].isoformat()
+            'dropped': self.message_stats['dropped'],
+            'uptime_seconds': time.monotonic() - self._start_monotonic,
+            'start_time': self._start_wall_iso
         }
     
     async def start(self):
@@ -258,14 +322,18 @@ class MessageBroker(LoggerMixin):
         debug_log(f"🛑 [MessageBroker] Message broker stopped")
     
     async def _message_processor(self):
-        """Background message processor."""
+        """Background message processor: drains the action queue and dispatches each message."""
         debug_log(f"⚙️ [MessageBroker] Message processor started")
         
+        queue = self.action_queue
         while self.running:
             try:
-                # Process messages from all queues
-                await asyncio.sleep(0.1)
-                
+                message = await queue.get()
+            except asyncio.CancelledError:
+                break
+            
+            try:
+                await self._dispatch(message)
             except asyncio.CancelledError:
                 break
             except Exception as e:
@@ -273,10 +341,24 @@ class MessageBroker(LoggerMixin):
                     "error": str(e),
                     "error_type": type(e).__name__
                 })
-                await asyncio.sleep(1)  # Wait before retrying
+            finally:
+                queue.task_done()
         
         debug_log(f"⚙️ [MessageBroker] Message processor stopped")
     
+    async def _dispatch(self, message: Dict[str, Any]):
+        """Deliver a queued message to the worker manager and registered handlers."""
+        action = message.get('action', 'unknown')
+        to_workers, handlers = self._routes.get(action, (True, ()))
+        
+        # Route based on action type; unknown actions go to the workers too
+        if to_workers and self.worker_manager:
+            await self.worker_manager.submit_task(action, message)
+        
+        # Notify handlers (skip the coroutine entirely for unhandled actions)
+        if handlers:
+            await self._notify_handlers(action, message, handlers)
+    
     async def cleanup(self):
         """Clean up message broker resources."""
         debug_log(f"🧹 [MessageBroker] Cleaning up message broker")
@@ -284,29 +366,14 @@ class MessageBroker(LoggerMixin):
         await self.stop()
         
         # Clear queues
-        while not self.action_queue.empty():
-            try:
-                self.action_queue.get_nowait()
-                self.action_queue.task_done()
-            except:
-                pass
-        
-        while not self.input_queue.empty():
-            try:
-                self.input_queue.get_nowait()
-                self.input_queue.task_done()
-            except:
-                pass
-        
-        while not self.response_queue.empty():
-            try:
-                self.response_queue.get_nowait()
-                self.response_queue.task_done()
-            except:
-                pass
+        for queue in (self.action_queue, self.input_queue, self.response_queue):
+            _drain_queue(queue)
         
-        # Clear handlers
+        # Clear handlers and their consumers
+        for action in list(self._handler_tasks):
+            self._drop_handler_loops(action)
         self.action_handlers.clear()
+        self._routes.clear()
         self.routing_rules.clear()
         
         debug_log(f"🧹 [MessageBroker] Message broker cleanup completed")
@@ -4,50 +4,85 @@ Handles background task processing and worker lifecycle management.
 """
 
 import asyncio
+import itertools
 import threading
+import time
 import datetime
-from typing import Dict, Any, Callable, Optional, List
+from typing import Dict, Any, Callable, Optional, List, Tuple
+from collections import Counter
 from concurrent.futures import ThreadPoolExecutor
 
-# Use absolute imports to avoid relative import issues
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Imports resolve against the server root (the entry scripts live there)
+from core.logging import LoggerMixin, debug_log, DEBUG_ENABLED
 
-from core.logging import LoggerMixin, debug_log
+
+# Sort key for stop sentinels: after every real task, whatever its priority
+_STOP_KEY = float('inf')
+
+
+class BatchedPriorityQueue(asyncio.PriorityQueue):
+    """asyncio.PriorityQueue whose consumers can take a whole burst of items per wakeup.
+    
+    Entries are (sort_key, seq, item) tuples; seq is unique, so items are never compared.
+    """
+    
+    async def drain(self, max_batch: int = 64, consumers: int = 1) -> List[Any]:
+        """Wait for at least one entry, then return the items of up to max_batch pending entries.
+        
+        The batch is also capped at this consumer's fair share of the backlog
+        (pending entries / consumers, at least one), so a burst is spread across
+        the consumers instead of being run serially by whichever woke first.
+        A None item (stop sentinel) always ends the batch, so each consumer
+        takes at most one sentinel.
+        """
+        item = (await self.get())[-1]
+        batch = [item]
+        limit = min(max_batch, max(1, (self.qsize() + 1) // consumers))
+        # No await below, so nothing else can touch the queue while the burst is taken
+        get_nowait = self.get_nowait
+        while item is not None and len(batch) < limit and not self.empty():
+            item = get_nowait()[-1]
+            batch.append(item)
+        return batch
 
 
 class WorkerManager(LoggerMixin):
     """Manages background workers and task processing."""
     
-    def __init__(self, max_workers: int = 4):
+    def __init__(self, max_workers: int = 4, queue_capacity: Optional[int] = None):
         self.max_workers = max_workers
+        # Pending-task cap: submit_task() waits (and submit_task_nowait() raises) when it is reached
+        self.queue_capacity = queue_capacity or max_workers * 64
         
         # Worker pools
         self.async_workers: List[asyncio.Task] = []
         self.thread_workers: List[threading.Thread] = []
-        self.thread_pool = ThreadPoolExecutor(max_workers=max_workers)
+        # Only sync handlers need threads; created on first use (see _get_thread_pool)
+        self.thread_pool: Optional[ThreadPoolExecutor] = None
         
-        # Task queues
-        self.task_queue = asyncio.Queue()
-        self.priority_queue = asyncio.Queue()
+        # Task queue shared by all workers: highest priority first, FIFO within a priority
+        # (workers drain up to drain_batch_size tasks per wakeup, split between the workers)
+        self.drain_batch_size = 64
+        self.task_queue = BatchedPriorityQueue(maxsize=self.queue_capacity)
+        # Submission counter: queue tie-break and task ID suffix
+        self._seq = itertools.count()
         
         # Worker state
         self.running = False
+        self.shutdown_timeout = 5.0
         self.worker_count = 0
         self.active_tasks = 0
         
-        # Task statistics
-        self.task_stats = {
-            'total_tasks': 0,
-            'completed_tasks': 0,
-            'failed_tasks': 0,
-            'tasks_by_type': {},
-            'start_time': datetime.datetime.now()
-        }
+        # Task statistics (plain counters; get_task_statistics() builds the report)
+        self._total_tasks = 0
+        self._completed_tasks = 0
+        self._failed_tasks = 0
+        self._tasks_by_type: Counter = Counter()
+        self._start_monotonic = time.monotonic()
+        self._start_wall_iso = datetime.datetime.now().isoformat()
         
-        # Task handlers
-        self.task_handlers: Dict[str, Callable] = {}
+        # Task handlers: task type -> (handler, is coroutine function?)
+        self.task_handlers: Dict[str, Tuple[Callable, bool]] = {}
         
         debug_log(f"👷 [WorkerManager] Worker manager initialized", {
             "max_workers": max_workers
@@ -55,7 +90,8 @@ class WorkerManager(LoggerMixin):
     
     def register_task_handler(self, task_type: str, handler: Callable):
         """Register a handler for a specific task type."""
-        self.task_handlers[task_type] = handler
+        # Decide once how the handler is run rather than on every task
+        self.task_handlers[task_type] = (handler, asyncio.iscoroutinefunction(handler))
         
         debug_log(f"➕ [WorkerManager] Task handler registered", {
             "task_type": task_type,
@@ -73,35 +109,41 @@ class WorkerManager(LoggerMixin):
                 "total_handlers": len(self.task_handlers)
             })
     
-    async def submit_task(self, task_type: str, data: Dict[str, Any], priority: int = 0) -> str:
-        """Submit a task for processing."""
-        try:
-            task_id = f"{task_type}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')}"
-            
-            task = {
-                'id': task_id,
-                'type': task_type,
-                'data': data,
-                'priority': priority,
-                'submitted_at': datetime.datetime.now(),
-                'status': 'pending'
-            }
-            
-            if priority > 0:
-                await self.priority_queue.put(task)
-            else:
-                await self.task_queue.put(task)
-            
-            self.task_stats['total_tasks'] += 1
-            self.task_stats['tasks_by_type'][task_type] = self.task_stats['tasks_by_type'].get(task_type, 0) + 1
-            
+    def _new_task(self, task_type: str, data: Dict[str, Any], priority: int) -> Tuple[tuple, str]:
+        """Build a pending task and its queue entry."""
+        seq = next(self._seq)
+        task_id = f"{task_type}_{seq:x}"
+        
+        task = {
+            'id': task_id,
+            'type': task_type,
+            'data': data,
+            'priority': priority,
+            'submitted_at': time.monotonic(),
+            'status': 'pending'
+        }
+        
+        return (-priority, seq, task), task_id
+    
+    def _task_queued(self, task_type: str, task_id: str, priority: int):
+        """Record a task that made it into the queue."""
+        self._total_tasks += 1
+        self._tasks_by_type[task_type] += 1
+        
+        if DEBUG_ENABLED:
             debug_log(f"📋 [WorkerManager] Task submitted", {
                 "task_id": task_id,
                 "task_type": task_type,
                 "priority": priority,
-                "queue_size": self.task_queue.qsize() + self.priority_queue.qsize()
+                "queue_size": self.task_queue.qsize()
             })
-            
+    
+    async def submit_task(self, task_type: str, data: Dict[str, Any], priority: int = 0) -> str:
+        """Submit a task for processing, waiting for room if the queue is full."""
+        try:
+            entry, task_id = self._new_task(task_type, data, priority)
+            await self.task_queue.put(entry)
+            self._task_queued(task_type, task_id, priority)
             return task_id
             
         except Exception as e:
@@ -112,6 +154,13 @@ class WorkerManager(LoggerMixin):
             })
             raise
     
+    def submit_task_nowait(self, task_type: str, data: Dict[str, Any], priority: int = 0) -> str:
+        """Submit a task without waiting; raises asyncio.QueueFull if the queue is at capacity."""
+        entry, task_id = self._new_task(task_type, data, priority)
+        self.task_queue.put_nowait(entry)
+        self._task_queued(task_type, task_id, priority)
+        return task_id
+    
     async def start_workers(self):
         """Start the worker pool."""
         if self.running:
@@ -124,10 +173,6 @@ class WorkerManager(LoggerMixin):
             worker = asyncio.create_task(self._async_worker(f"async_worker_{i}"))
             self.async_workers.append(worker)
         
-        # Start priority worker
-        priority_worker = asyncio.create_task(self._priority_worker())
-        self.async_workers.append(priority_worker)
-        
         debug_log(f"🚀 [WorkerManager] Workers started", {
             "async_workers": len(self.async_workers),
             "max_workers": self.max_workers
@@ -140,37 +185,46 @@ class WorkerManager(LoggerMixin):
         
         self.running = False
         
-        # Cancel async workers
-        for worker in self.async_workers:
-            worker.cancel()
+        # One stop sentinel per worker, queued behind any pending tasks
+        # (if the queue is full, workers left without one are cancelled after the timeout)
+        for _ in range(self.max_workers):
+            try:
+                self.task_queue.put_nowait((_STOP_KEY, next(self._seq), None))
+            except asyncio.QueueFull:
+                break
         
-        # Wait for workers to finish
+        # Give workers a moment to drain, then cancel any still busy
+        # (results are not needed, so no gather)
         if self.async_workers:
-            await asyncio.gather(*self.async_workers, return_exceptions=True)
+            _, pending = await asyncio.wait(self.async_workers, timeout=self.shutdown_timeout)
+            for worker in pending:
+                worker.cancel()
+            if pending:
+                await asyncio.wait(pending)
+            self.async_workers.clear()
         
-        # Shutdown thread pool
-        self.thread_pool.shutdown(wait=True)
+        # Shutdown thread pool (if any sync handler ever ran)
+        if self.thread_pool is not None:
+            self.thread_pool.shutdown(wait=True)
+            self.thread_pool = None
         
         debug_log(f"🛑 [WorkerManager] Workers stopped")
     
     async def _async_worker(self, worker_name: str):
         """Async worker that processes tasks from the queue."""
-        debug_log(f"👷 [WorkerManager] {worker_name} started")
+        if DEBUG_ENABLED:
+            debug_log(f"👷 [WorkerManager] {worker_name} started")
         
-        while self.running:
+        while True:
             try:
-                # Get task from queue with timeout
-                try:
-                    task = await asyncio.wait_for(self.task_queue.get(), timeout=1.0)
-                except asyncio.TimeoutError:
-                    continue
+                # Take this worker's share of the pending tasks (up to the batch size)
+                # in one wakeup; stop_workers() ends the loop with a None sentinel
+                batch = await self.task_queue.drain(self.drain_batch_size, self.max_workers)
                 
-                if task is None:
+                stop = await self._process_batch(self.task_queue, batch, worker_name)
+                if stop:
                     break
                 
-                await self._process_task(task, worker_name)
-                self.task_queue.task_done()
-                
             except asyncio.CancelledError:
                 break
             except Exception as e:
@@ -180,36 +234,48 @@ class WorkerManager(LoggerMixin):
                 })
                 await asyncio.sleep(1)  # Wait before retrying
         
-        debug_log(f"👷 [WorkerManager] {worker_name} stopped")
+        if DEBUG_ENABLED:
+            debug_log(f"👷 [WorkerManager] {worker_name} stopped")
     
-    async def _priority_worker(self):
-        """Priority worker that processes high-priority tasks."""
-        debug_log(f"👷 [WorkerManager] Priority worker started")
-        
-        while self.running:
-            try:
-                # Get priority task from queue with timeout
-                try:
-                    task = await asyncio.wait_for(self.priority_queue.get(), timeout=1.0)
-                except asyncio.TimeoutError:
-                    continue
-                
+    def _get_thread_pool(self) -> ThreadPoolExecutor:
+        """Get the thread pool for sync handlers, creating it on first use."""
+        if self.thread_pool is None:
+            self.thread_pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self.thread_pool
+    
+    async def _process_batch(self, queue: BatchedPriorityQueue, batch: List[Any], worker_name: str) -> bool:
+        """Process a drained batch inline; returns True if a stop sentinel was seen."""
+        stop = False
+        processed = 0
+        try:
+            for task in batch:
                 if task is None:
-                    break
-                
-                await self._process_task(task, "priority_worker")
-                self.priority_queue.task_done()
+                    stop = True
+                else:
+                    await self._process_task(task, worker_name)
+                processed += 1
+        finally:
+            # Cancelled part-way (stop_workers() timeout): the interrupted task and the rest
+            # of the batch never finish, so record them as failed before marking them done
+            unfinished = [task for task in batch[processed:] if task is not None]
+            if unfinished:
+                now = time.monotonic()
+                for task in unfinished:
+                    task['status'] = 'failed'
+                    task['error'] = "Worker stopped before the task finished"
+                    task['failed_at'] = now
+                self._failed_tasks += len(unfinished)
                 
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                debug_log(f"❌ [WorkerManager] Priority worker error", {
-                    "error": str(e),
-                    "error_type": type(e).__name__
+                debug_log(f"⚠️ [WorkerManager] {worker_name} stopped with unfinished tasks", {
+                    "worker": worker_name,
+                    "unfinished": len(unfinished),
+                    "task_ids": [task['id'] for task in unfinished]
                 })
-                await asyncio.sleep(1)  # Wait before retrying
-        
-        debug_log(f"👷 [WorkerManager] Priority worker stopped")
+            
+            # Mark the whole batch done even if the worker is cancelled part-way
+            for _ in batch:
+                queue.task_done()
+        return stop
     
     async def _process_task(self, task: Dict[str, Any], worker_name: str):
         """Process a single task."""
@@ -218,47 +284,49 @@ class WorkerManager(LoggerMixin):
         task_data = task['data']
         
         try:
-            debug_log(f"⚙️ [WorkerManager] Processing task", {
-                "worker": worker_name,
-                "task_id": task_id,
-                "task_type": task_type
-            })
+            if DEBUG_ENABLED:
+                debug_log(f"⚙️ [WorkerManager] Processing task", {
+                    "worker": worker_name,
+                    "task_id": task_id,
+                    "task_type": task_type
+                })
             
             task['status'] = 'processing'
             task['worker'] = worker_name
-            task['started_at'] = datetime.datetime.now()
+            task['started_at'] = time.monotonic()
             self.active_tasks += 1
             
             # Check if we have a handler for this task type
-            if task_type in self.task_handlers:
-                handler = self.task_handlers[task_type]
-                
+            entry = self.task_handlers.get(task_type)
+            if entry is not None:
+                handler, is_coro = entry
                 # Execute handler
-                if asyncio.iscoroutinefunction(handler):
+                if is_coro:
                     result = await handler(task_data)
                 else:
                     # Run in thread pool for sync handlers
                     loop = asyncio.get_event_loop()
-                    result = await loop.run_in_executor(self.thread_pool, handler, task_data)
+                    result = await loop.run_in_executor(self._get_thread_pool(), handler, task_data)
                 
                 task['status'] = 'completed'
                 task['result'] = result
-                task['completed_at'] = datetime.datetime.now()
+                task['completed_at'] = time.monotonic()
                 
-                self.task_stats['completed_tasks'] += 1
+                self._completed_tasks += 1
                 
-                debug_log(f"✅ [WorkerManager] Task completed", {
-                    "worker": worker_name,
-                    "task_id": task_id,
-                    "task_type": task_type
-                })
+                if DEBUG_ENABLED:
+                    debug_log(f"✅ [WorkerManager] Task completed", {
+                        "worker": worker_name,
+                        "task_id": task_id,
+                        "task_type": task_type
+                    })
                 
             else:
                 task['status'] = 'failed'
                 task['error'] = f"No handler registered for task type: {task_type}"
-                task['failed_at'] = datetime.datetime.now()
+                task['failed_at'] = time.monotonic()
                 
-                self.task_stats['failed_tasks'] += 1
+                self._failed_tasks += 1
                 
                 debug_log(f"❌ [WorkerManager] Task failed - no handler", {
                     "worker": worker_name,
@@ -270,9 +338,9 @@ class WorkerManager(LoggerMixin):
             task['status'] = 'failed'
             task['error'] = str(e)
             task['error_type'] = type(e).__name__
-            task['failed_at'] = datetime.datetime.now()
+            task['failed_at'] = time.monotonic()
             
-            self.task_stats['failed_tasks'] += 1
+            self._failed_tasks += 1
             
             debug_log(f"❌ [WorkerManager] Task processing error", {
                 "worker": worker_name,
@@ -293,34 +361,34 @@ class WorkerManager(LoggerMixin):
             'active_workers': len(self.async_workers),
             'active_tasks': self.active_tasks,
             'task_queue_size': self.task_queue.qsize(),
-            'priority_queue_size': self.priority_queue.qsize(),
+            'queue_capacity': self.queue_capacity,
             'total_handlers': len(self.task_handlers)
         }
     
     def get_task_statistics(self) -> Dict[str, Any]:
         """Get task processing statistics."""
-        uptime = datetime.datetime.now() - self.task_stats['start_time']
-        
         return {
-            'total_tasks': self.task_stats['total_tasks'],
-            'completed_tasks': self.task_stats['completed_tasks'],
-            'failed_tasks': self.task_stats['failed_tasks'],
-            'success_rate': (self.task_stats['completed_tasks'] / max(self.task_stats['total_tasks'], 1)) * 100,
-            'tasks_by_type': dict(self.task_stats['tasks_by_type']),
-            'uptime_seconds': uptime.total_seconds(),
-            'start_time': self.task_stats['start_time'].isoformat()
+            'total_tasks': self._total_tasks,
+            'completed_tasks': self._completed_tasks,
+            'failed_tasks': self._failed_tasks,
+            'success_rate': (self._completed_tasks / max(self._total_tasks, 1)) * 100,
+            'tasks_by_type': dict(self._tasks_by_type),
+            'uptime_seconds': time.monotonic() - self._start_monotonic,
+            'start_time': self._start_wall_iso
         }
     
     async def wait_for_completion(self, timeout: Optional[float] = None):
         """Wait for all tasks to complete."""
         try:
-            await asyncio.wait_for(
-                asyncio.gather(
-                    self.task_queue.join(),
-                    self.priority_queue.join()
-                ),
-                timeout=timeout
-            )
+            join = self.task_queue.join()
+            if timeout is None:
+                await join
+            elif hasattr(asyncio, 'timeout'):
+                # Python 3.11+: a deadline on the current task, no wrapper Task for join()
+                async with asyncio.timeout(timeout):
+                    await join
+            else:
+                await asyncio.wait_for(join, timeout=timeout)
             
             debug_log(f"✅ [WorkerManager] All tasks completed")
             
@@ -338,20 +406,9 @@ class WorkerManager(LoggerMixin):
         
         await self.stop_workers()
         
-        # Clear queues
-        while not self.task_queue.empty():
-            try:
-                self.task_queue.get_nowait()
-                self.task_queue.task_done()
-            except:
-                pass
-        
-        while not self.priority_queue.empty():
-            try:
-                self.priority_queue.get_nowait()
-                self.priority_queue.task_done()
-            except:
-                pass
+        # Clear queues: the workers are gone, so swap in an empty queue and let the
+        # old one (and whatever is still pending in it) be garbage collected
+        self.task_queue = BatchedPriorityQueue(maxsize=self.queue_capacity)
         
         # Clear handlers
         self.task_handlers.clear()
@@ -5,14 +5,170 @@ Runs as watcher user - makes HTTP calls to Firebase Functions (no Admin SDK)
 Monitors credits, heartbeat, and process health
 """
 import asyncio
+import concurrent.futures
+import grp
+import http.client
 import os
+import random
+import shutil
+import socket
 import time
 import logging
 import subprocess
 import sys
-import requests
-import socket
-from typing import Optional
+import httpx
+import xmlrpc.client
+from typing import Dict, List, Optional, Set, Tuple
+
+SUPERVISOR_SOCKET = '/var/run/supervisor.sock'
+# Socket timeout for ordinary supervisor XML-RPC calls
+SUPERVISOR_RPC_TIMEOUT = 5
+# supervisord's stopwaitsecs (supervisord.conf leaves it at the default): the longest a
+# waiting stopProcess call can block before the program is killed
+SUPERVISOR_STOPWAITSECS = 10
+# Readiness probes target the loopback address directly ('localhost' resolves to it in the containers)
+LOCALHOST = '127.0.0.1'
+# Resolved once so the fallback doesn't search PATH on every spawn
+SUPERVISORCTL = [shutil.which('supervisorctl') or 'supervisorctl', '-c', '/etc/supervisor/conf.d/supervisord.conf']
+
+# HTTP/2 lets the concurrent function calls share one connection to Firebase (needs h2)
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Prefer orjson for the function call bodies; fall back to stdlib json
+try:
+    from orjson import dumps as json_dumps, loads as json_loads
+except ImportError:
+    import json
+    
+    def json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode()
+    
+    json_loads = json.loads
+
+# VastAI identity port variables reported to the session document: (env var, label, protocol).
+# VastAI uses identity port mapping - the port bound internally is the same as the external port
+VAST_PORT_SPECS = (
+    ('VAST_TCP_PORT_70000', 'python', 'tcp'),   # Python server
+    ('VAST_UDP_PORT_70001', 'turn', 'udp'),     # TURN server
+    ('VAST_TCP_PORT_70002', 'jupyter', 'tcp'),  # Jupyter
+    ('VAST_TCP_PORT_22', 'ssh', 'tcp'),         # SSH
+)
+
+
+def _parse_vast_ports() -> List[dict]:
+    """Build the session ports array from the VAST_* environment variables
+    
+    Format: [{"label": "python", "internal": 27804, "external": 27804, "protocol": "tcp"}, ...]
+    """
+    ports = []
+    for env_key, label, protocol in VAST_PORT_SPECS:
+        value = os.environ.get(env_key)
+        if not value:
+            continue
+        try:
+            port = int(value)
+        except ValueError:
+            logger.warning(f"Invalid {env_key}: {value}")
+            continue
+        ports.append({
+            "label": label,
+            "internal": port,  # Identity mapping: internal = external
+            "external": port,
+            "protocol": protocol
+        })
+    return ports
+
+
+# Per-request timeout for the localhost readiness probes
+SERVICE_PROBE_TIMEOUT = 3.0
+# How long the executor-side process check waits for the loop-side readiness check: the
+# probe plus slack for the ss/netstat fallbacks (up to 2s each per port) it may run
+SOCKET_CHECK_TIMEOUT = SERVICE_PROBE_TIMEOUT + 10.0
+
+# Public IP sources used when PUBLIC_IPADDR is unset or "auto"
+PUBLIC_IP_METADATA_URL = 'http://169.254.169.254/metadata/v1/interfaces/public/0/ipv4/address'
+PUBLIC_IP_FALLBACK_URL = 'https://ifconfig.co'
+# The answer is a few bytes, so connects and reads fail fast (one retry each) under an overall cap;
+# the link-local metadata service gets less time than the internet round trip
+PUBLIC_IP_METADATA_TIMEOUT = httpx.Timeout(1.0)
+PUBLIC_IP_FALLBACK_TIMEOUT = httpx.Timeout(3.0, connect=1.0)
+PUBLIC_IP_DETECT_TIMEOUT = 5.0
+
+# Sent with every pre-encoded function call body
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+# psutil backs the process checks; without it they fail open (see _check_turn_server_process)
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Command-line fragments that identify the Python server process
+PYTHON_SERVER_NEEDLES = ('run_modular.py', 'server_modular')
+
+
+def _cmdline_has(cmdline, needles, ignore_case: bool = False) -> bool:
+    """True if any argv element contains any of the needles (stops at the first match)"""
+    for arg in cmdline:
+        if not isinstance(arg, str):
+            continue
+        if ignore_case:
+            arg = arg.lower()
+        for needle in needles:
+            if needle in arg:
+                return True
+    return False
+
+# Bits in MonitorService._log_flags for messages logged at info level only the first time
+LOG_JUPYTER_LISTENING = 1 << 0
+LOG_JUPYTER_NOT_LISTENING = 1 << 1
+LOG_PYTHON_LISTENING = 1 << 2
+LOG_PYTHON_NOT_LISTENING = 1 << 3
+LOG_SERVICES_READY = 1 << 4
+LOG_SUPERVISOR_RPC_FAILED = 1 << 5
+LOG_SUPERVISORCTL_FAILED = 1 << 6
+LOG_SUPERVISOR_STATES = 1 << 7
+LOG_SUPERVISORCTL_TIMEOUT = 1 << 8
+LOG_SUPERVISORCTL_ERROR = 1 << 9
+LOG_PROCESSES_WITHOUT_SOCKETS = 1 << 10
+LOG_SERVICES_STARTING = 1 << 11
+
+
+def _env_display(name: str) -> str:
+    """Environment variable value for the startup log"""
+    return os.getenv(name) or '<not set>'
+
+
+def _mask(value: Optional[str]) -> str:
+    """Stand-in for a sensitive value in the startup log"""
+    return '<set>' if value else '<not set>'
+
+
+class _UnixSocketHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection to supervisord's Unix socket (the host name is only used for the Host header)"""
+    
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(SUPERVISOR_SOCKET)
+
+
+class _UnixSocketTransport(xmlrpc.client.Transport):
+    """XML-RPC transport over supervisord's Unix socket; keeps the connection alive between calls"""
+    
+    def __init__(self, timeout: float = SUPERVISOR_RPC_TIMEOUT):
+        super().__init__()
+        self.timeout = timeout
+    
+    def make_connection(self, host):
+        if self._connection[1] is None:
+            self._connection = host, _UnixSocketHTTPConnection(host, timeout=self.timeout)
+        return self._connection[1]
+
 
 # Configure logging
 logging.basicConfig(
@@ -20,6 +176,8 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
+# httpx logs every request at info level; the probes and heartbeats would flood the log
+logging.getLogger('httpx').setLevel(logging.WARNING)
 
 class MonitorService:
     def __init__(self):
@@ -38,55 +196,85 @@ class MonitorService:
             sys.exit(1)
         
         self.heartbeat_threshold = 5 * 60  # 5 minutes
+        # Check cadences in seconds; the loop ticks at services_ready_interval until the
+        # session has started, then at heartbeat_interval, and runs each check when it is due.
+        # heartbeat_interval adapts: it drops to heartbeat_interval_min whenever the monitored
+        # state changes and backs off by heartbeat_backoff per quiet cycle up to monitor_interval
+        self.monitor_interval = 60
+        self.services_ready_interval = 10
+        self.process_health_interval = 60
+        self.heartbeat_interval_min = 5.0
+        self.heartbeat_backoff = 1.5
+        self.heartbeat_interval = self.heartbeat_interval_min
+        self.credits_check_interval = 5 * 60
         self.reconnect_grace_period = 60 * 60  # 1 hour
         self.grace_period_start: Optional[float] = None
         self.is_charging = True
         self.session_started = False  # Track if we've marked session as started
         self.start_turn = os.getenv('START_TURN', 'true').lower() == 'true'
         
-        logger.info(f"Monitor service initialized for user {self.user_id}, instance {self.instance_id}, type {self.resource_type}")
-        
-        # Log environment variables for debugging (excluding sensitive values)
-        logger.info("=== Environment Variables ===")
-        logger.info(f"  USER_ID: {self.user_id}")
-        logger.info(f"  INSTANCE_ID: {self.instance_id}")
-        logger.info(f"  RESOURCE_TYPE: {self.resource_type}")
-        logger.info(f"  FIREBASE_FUNCTIONS_URL: {self.functions_url}")
-        logger.info(f"  MONITOR_API_KEY: {'<set>' if self.api_key else '<not set>'}")
-        
-        # Port mapping variables (VastAI identity ports)
-        vast_tcp_70000 = os.getenv('VAST_TCP_PORT_70000')
-        vast_udp_70001 = os.getenv('VAST_UDP_PORT_70001')
-        vast_tcp_70002 = os.getenv('VAST_TCP_PORT_70002')
-        vast_tcp_22 = os.getenv('VAST_TCP_PORT_22')
-        logger.info("  === Port Mapping Variables ===")
-        logger.info(f"  VAST_TCP_PORT_70000 (Python server): {vast_tcp_70000 or '<not set>'}")
-        logger.info(f"  VAST_UDP_PORT_70001 (TURN server): {vast_udp_70001 or '<not set>'}")
-        logger.info(f"  VAST_TCP_PORT_70002 (Jupyter): {vast_tcp_70002 or '<not set>'}")
-        logger.info(f"  VAST_TCP_PORT_22 (SSH): {vast_tcp_22 or '<not set>'}")
-        
-        # Network variables
-        public_ip = os.getenv('PUBLIC_IPADDR', '')
-        logger.info("  === Network Variables ===")
-        logger.info(f"  PUBLIC_IPADDR: {public_ip or '<not set>'}")
-        
-        # Service configuration
-        start_turn = os.getenv('START_TURN', '')
+        # Environment-derived settings that are fixed for the life of the process
+        self.python_port = int(os.getenv('VAST_TCP_PORT_70000', '8765'))  # VastAI maps internal 8765 to an external port
         jupyter_token = os.getenv('JUPYTER_TOKEN', '')
-        turn_username = os.getenv('TURN_USERNAME', '')
-        turn_password = os.getenv('TURN_PASSWORD', '')
-        logger.info("  === Service Configuration ===")
-        logger.info(f"  START_TURN: {start_turn or '<not set>'}")
-        logger.info(f"  JUPYTER_TOKEN: {'<set>' if jupyter_token else '<not set>'}")
-        logger.info(f"  TURN_USERNAME: {turn_username or '<not set>'}")
-        logger.info(f"  TURN_PASSWORD: {'<set>' if turn_password else '<not set>'}")
-        logger.info("================================")
+        self._jupyter_headers = {'Authorization': f'Token {jupyter_token}'} if jupyter_token else None
+        self._turn_username = os.getenv('TURN_USERNAME', 'user')
+        self._turn_password = os.getenv('TURN_PASSWORD')
+        # VastAI identity port mappings and public IP, reported by update_session_ports_and_ip
+        self._session_ports = _parse_vast_ports()  # Fixed for the process, so built once
+        self._public_ip = os.environ.get('PUBLIC_IPADDR', '')  # Replaced by the detected IP once known
+        self._last_ports_payload: Optional[tuple] = None  # (ports, public IP) last sent to updateSessionPorts
+        self._ports_body: Optional[Tuple[tuple, bytes]] = None  # (payload key, encoded request body)
+        self.ports_update_attempts = 3
+        self.ports_retry_max_delay = 30.0
+        self._http: Optional[httpx.AsyncClient] = None  # Shared HTTP client for function calls and probes
+        self._loop: Optional[asyncio.AbstractEventLoop] = None  # Set by monitor_loop()
+        # Background writes the loop doesn't wait on (see _spawn), awaited in close()
+        self.max_pending = 16
+        self._pending: Set[asyncio.Task] = set()
+        self._start_task: Optional[asyncio.Task] = None  # In-flight markSessionStarted call
+        self._wake = asyncio.Event()  # Set by wake() to start the next cycle right away
+        self._supervisor: Optional[xmlrpc.client.ServerProxy] = None  # XML-RPC proxy, created on first use
+        # Last process scan: (monotonic time, (jupyter, python server, TURN server) found)
+        self.process_scan_ttl = 10
+        self._process_scan: Tuple[float, Optional[Tuple[bool, bool, bool]]] = (0.0, None)
+        self._watcher_gid: Optional[int] = None
+        self._log_flags = 0  # LOG_* bits for one-time messages already logged
+        self._fix_supervisor_socket_perms()
+        
+        # Startup banner and environment variables for debugging (excluding sensitive values),
+        # written as one log record
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("\n".join((
+                f"Monitor service initialized for user {self.user_id}, instance {self.instance_id}, type {self.resource_type}",
+                "=== Environment Variables ===",
+                f"  USER_ID: {self.user_id}",
+                f"  INSTANCE_ID: {self.instance_id}",
+                f"  RESOURCE_TYPE: {self.resource_type}",
+                f"  FIREBASE_FUNCTIONS_URL: {self.functions_url}",
+                f"  MONITOR_API_KEY: {_mask(self.api_key)}",
+                # Port mapping variables (VastAI identity ports)
+                "  === Port Mapping Variables ===",
+                f"  VAST_TCP_PORT_70000 (Python server): {_env_display('VAST_TCP_PORT_70000')}",
+                f"  VAST_UDP_PORT_70001 (TURN server): {_env_display('VAST_UDP_PORT_70001')}",
+                f"  VAST_TCP_PORT_70002 (Jupyter): {_env_display('VAST_TCP_PORT_70002')}",
+                f"  VAST_TCP_PORT_22 (SSH): {_env_display('VAST_TCP_PORT_22')}",
+                # Network variables
+                "  === Network Variables ===",
+                f"  PUBLIC_IPADDR: {_env_display('PUBLIC_IPADDR')}",
+                # Service configuration
+                "  === Service Configuration ===",
+                f"  START_TURN: {_env_display('START_TURN')}",
+                f"  JUPYTER_TOKEN: {_mask(os.getenv('JUPYTER_TOKEN'))}",
+                f"  TURN_USERNAME: {_env_display('TURN_USERNAME')}",
+                f"  TURN_PASSWORD: {_mask(os.getenv('TURN_PASSWORD'))}",
+                "================================",
+            )))
     
     async def update_turn_credentials(self):
         """Update TURN credentials in Firestore session document"""
         try:
-            turn_username = os.getenv('TURN_USERNAME', 'user')
-            turn_password = os.getenv('TURN_PASSWORD')
+            turn_username = self._turn_username
+            turn_password = self._turn_password
             
             if not turn_password:
                 logger.warning("TURN_PASSWORD not set, skipping TURN credentials update")
@@ -106,22 +294,77 @@ class MonitorService:
         except Exception as e:
             logger.error(f"Error updating TURN credentials: {e}")
     
-    async def _call_function(self, function_name: str, data: dict) -> Optional[dict]:
-        """Make HTTP POST request to Firebase Function"""
+    def _get_http(self) -> httpx.AsyncClient:
+        """Get the shared HTTP client, creating it on first use"""
+        if self._http is None or self._http.is_closed:
+            # A handful of pooled connections is plenty for the few calls made per cycle;
+            # keep them warm across the 60s gap between cycles. Over HTTP/2 the calls to
+            # Firebase are multiplexed on one connection; plain-http localhost probes stay on HTTP/1.1
+            limits = httpx.Limits(max_connections=4, max_keepalive_connections=4, keepalive_expiry=90)
+            self._http = httpx.AsyncClient(http2=HTTP2_AVAILABLE, timeout=30.0, limits=limits)
+        return self._http
+    
+    def _spawn(self, coro) -> Optional[asyncio.Task]:
+        """Run an idempotent write in the background; the loop carries on without its result"""
+        if len(self._pending) >= self.max_pending:
+            coro.close()
+            logger.warning(f"Too many background calls in flight ({len(self._pending)}), skipping one")
+            return None
+        task = asyncio.create_task(coro)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        return task
+    
+    def wake(self):
+        """Run the next monitor cycle now instead of at its scheduled time (call from the loop's thread)"""
+        self._wake.set()
+    
+    async def _sleep_or_wake(self, timeout: float) -> bool:
+        """Sleep up to timeout seconds; returns True if wake() cut the sleep short"""
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._wake.clear()
+        return True
+    
+    async def close(self, cancel_pending: bool = False):
+        """Wait for (or cancel) background calls, then close the shared HTTP client"""
+        if self._pending:
+            if cancel_pending:
+                for task in self._pending:
+                    task.cancel()
+            await asyncio.gather(*self._pending, return_exceptions=True)
+        if self._http is not None and not self._http.is_closed:
+            await self._http.aclose()
+        self._http = None
+    
+    def _encode_call(self, data: dict) -> bytes:
+        """Encode a Firebase Function request body (adds the API key)"""
+        return json_dumps({**data, "apiKey": self.api_key})
+    
+    async def _call_function(self, function_name: str, data: Optional[dict] = None,
+                             body: Optional[bytes] = None) -> Optional[dict]:
+        """Make HTTP POST request to Firebase Function
+        
+        Pass either data, or a body already encoded with _encode_call for payloads that are resent.
+        """
         try:
             url = f"{self.functions_url}/{function_name}"
-            payload = {**data, "apiKey": self.api_key}
+            if body is None:
+                body = self._encode_call(data)
             
-            response = requests.post(url, json=payload, timeout=30)
+            # Pooled client: keeps the connection (TCP, TLS) alive between cycles
+            response = await self._get_http().post(url, content=body, headers=JSON_HEADERS)
             response.raise_for_status()
+            result = json_loads(response.content)
             
-            result = response.json()
             if not result.get('success', False):
                 logger.error(f"Function {function_name} returned error: {result.get('error', 'Unknown error')}")
                 return None
             
             return result
-        except requests.exceptions.RequestException as e:
+        except httpx.HTTPError as e:
             logger.error(f"HTTP error calling {function_name}: {e}")
             return None
         except Exception as e:
@@ -133,16 +376,9 @@ class MonitorService:
         if not self.start_turn:
             return True  # Not required to be running
         try:
-            import psutil
-            for proc in psutil.process_iter(['name', 'cmdline']):
-                try:
-                    cmdline = proc.info.get('cmdline') or []
-                    cmdline_str = ' '.join(str(c) for c in cmdline)
-                    if 'turnserver' in cmdline_str:
-                        logger.debug("TURN server process found.")
-                        return True
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    continue
+            if self._find_service_processes()[2]:
+                logger.debug("TURN server process found.")
+                return True
             logger.debug("TURN server process not found.")
             return False
         except ImportError:
@@ -152,124 +388,85 @@ class MonitorService:
             logger.error(f"Error checking TURN server process: {e}")
             return False
 
-    def _check_services_ready(self) -> bool:
+    async def _probe_service(self, name: str, url: str, port: int, ok_statuses: tuple,
+                             headers: Optional[dict] = None) -> Tuple[bool, Optional[str]]:
+        """HTTP readiness probe on localhost; returns (ready, error)
+        
+        The request itself tells whether the port accepts connections: a failed connect
+        means it doesn't, while a connection that errors afterwards still proves it does,
+        so no separate TCP probe (and socket) is needed.
+        """
+        try:
+            # Pooled client: a kept-alive connection is reused across cycles
+            response = await self._get_http().get(url, headers=headers, timeout=SERVICE_PROBE_TIMEOUT)
+            return response.status_code in ok_statuses, None
+        except httpx.ConnectError as e:
+            error = str(e) or 'connection refused'
+            logger.debug("Error connecting to %s on %s:%d: %s", name, LOCALHOST, port, error)
+            return False, error
+        except (httpx.NetworkError, httpx.RemoteProtocolError):
+            # Connected, but the server dropped the request - it is up and accepting connections
+            return True, None
+        except Exception as e:
+            logger.debug("Error checking %s on %s:%d: %s", name, LOCALHOST, port, e)
+            return False, str(e) or type(e).__name__
+    
+    async def _check_services_ready(self) -> bool:
         """Check if Jupyter (port 8888) and Python server (VAST_TCP_PORT_70000 or 8765) are accepting connections"""
         try:
-            # Get Python server port from environment variable (VastAI maps internal 8765 to external port)
-            python_port = int(os.getenv('VAST_TCP_PORT_70000', '8765'))
-            
-            # Check Jupyter on port 8888 - use HTTP request to API endpoint (more reliable)
-            jupyter_ready = False
-            jupyter_error = None
-            for host in ['127.0.0.1', 'localhost']:
-                try:
-                    # Try HTTP request to Jupyter API (more reliable than socket)
-                    jupyter_token = os.getenv('JUPYTER_TOKEN', '')
-                    api_url = f"http://{host}:8888/api"
-                    headers = {}
-                    if jupyter_token:
-                        headers['Authorization'] = f'Token {jupyter_token}'
-                    
-                    response = requests.get(api_url, headers=headers, timeout=3)
-                    if response.status_code in [200, 401, 403]:  # 401/403 means server is up but auth failed
-                        jupyter_ready = True
-                        break
-                except requests.exceptions.ConnectionError:
-                    # Try socket connection as fallback
-                    try:
-                        jupyter_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                        jupyter_socket.settimeout(2)
-                        jupyter_result = jupyter_socket.connect_ex((host, 8888))
-                        jupyter_socket.close()
-                        if jupyter_result == 0:
-                            jupyter_ready = True
-                            break
-                        else:
-                            jupyter_error = f"Connection failed with error code {jupyter_result}"
-                    except Exception as e:
-                        jupyter_error = str(e)
-                        logger.debug(f"Error connecting to Jupyter on {host}:8888: {e}")
-                except Exception as e:
-                    jupyter_error = str(e)
-                    logger.debug(f"Error checking Jupyter on {host}:8888: {e}")
-                    continue
-            
-            # Check Python server on the actual port (VAST_TCP_PORT_70000 or 8765) - use HTTP request to /status endpoint (more reliable)
-            python_ready = False
-            python_error = None
-            for host in ['127.0.0.1', 'localhost']:
-                try:
-                    # Try HTTP request to /status endpoint (more reliable than socket)
-                    status_url = f"http://{host}:{python_port}/status"
-                    response = requests.get(status_url, timeout=3)
-                    if response.status_code == 200:
-                        python_ready = True
-                        break
-                except requests.exceptions.ConnectionError:
-                    # Try socket connection as fallback
-                    try:
-                        python_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                        python_socket.settimeout(2)
-                        python_result = python_socket.connect_ex((host, python_port))
-                        python_socket.close()
-                        if python_result == 0:
-                            python_ready = True
-                            break
-                        else:
-                            python_error = f"Connection failed with error code {python_result}"
-                    except Exception as e:
-                        python_error = str(e)
-                        logger.debug(f"Error connecting to Python server on {host}:{python_port}: {e}")
-                except Exception as e:
-                    python_error = str(e)
-                    logger.debug(f"Error checking Python server on {host}:{python_port}: {e}")
-                    continue
+            python_port = self.python_port
+            
+            # Jupyter: HTTP request to the API endpoint (401/403 means server is up but auth failed)
+            # Python server: HTTP request to /status on the actual port (VAST_TCP_PORT_70000 or 8765)
+            (jupyter_ready, jupyter_error), (python_ready, python_error) = await asyncio.gather(
+                self._probe_service('Jupyter', f"http://{LOCALHOST}:8888/api", 8888, (200, 401, 403), self._jupyter_headers),
+                self._probe_service('Python server', f"http://{LOCALHOST}:{python_port}/status", python_port, (200,))
+            )
             
             # If HTTP checks fail, try checking if ports are listening using ss/netstat
             if not jupyter_ready:
                 port_listening = self._check_port_listening(8888)
                 if port_listening:
                     # Port is listening but HTTP requests failing - might be starting up or auth issue
-                    if not hasattr(self, '_jupyter_port_listening_logged'):
+                    if not self._log_flags & LOG_JUPYTER_LISTENING:
                         logger.info("Jupyter port 8888 is listening but HTTP requests failing (service may be starting or auth issue)")
-                        self._jupyter_port_listening_logged = True
+                        self._log_flags |= LOG_JUPYTER_LISTENING
                 else:
                     # Log first time we detect port not listening
-                    if not hasattr(self, '_jupyter_port_not_listening_logged'):
+                    if not self._log_flags & LOG_JUPYTER_NOT_LISTENING:
                         logger.info(f"Jupyter port 8888 not listening: {jupyter_error or 'connection refused'}")
-                        self._jupyter_port_not_listening_logged = True
+                        self._log_flags |= LOG_JUPYTER_NOT_LISTENING
                     else:
-                        logger.debug(f"Jupyter port 8888 not listening: {jupyter_error or 'connection refused'}")
+                        logger.debug("Jupyter port 8888 not listening: %s", jupyter_error or 'connection refused')
             
             if not python_ready:
                 port_listening = self._check_port_listening(python_port)
                 if port_listening:
                     # Port is listening but HTTP /status endpoint not responding - server may still be initializing
-                    if not hasattr(self, '_python_port_listening_logged'):
+                    if not self._log_flags & LOG_PYTHON_LISTENING:
                         logger.info(f"Python server port {python_port} is listening but /status endpoint not responding (server may still be initializing)")
-                        self._python_port_listening_logged = True
+                        self._log_flags |= LOG_PYTHON_LISTENING
                 else:
                     # Log first time we detect port not listening
-                    if not hasattr(self, '_python_port_not_listening_logged'):
+                    if not self._log_flags & LOG_PYTHON_NOT_LISTENING:
                         logger.info(f"Python server port {python_port} not listening: {python_error or 'connection refused'}")
-                        self._python_port_not_listening_logged = True
+                        self._log_flags |= LOG_PYTHON_NOT_LISTENING
                     else:
-                        logger.debug(f"Python server port {python_port} not listening: {python_error or 'connection refused'}")
+                        logger.debug("Python server port %d not listening: %s", python_port, python_error or 'connection refused')
             
             # Check TURN server process if it's supposed to start
-            turn_ready = self._check_turn_server_process()
+            turn_ready = await asyncio.to_thread(self._check_turn_server_process)
 
             if jupyter_ready and python_ready and turn_ready:
                 # Only log at info level if this is the first time services are ready
                 # (to avoid spam when called from process health check)
-                if not hasattr(self, '_services_ready_logged'):
+                if not self._log_flags & LOG_SERVICES_READY:
                     logger.info("All services (Jupyter, Python server, TURN server) are ready")
-                    self._services_ready_logged = True
+                    self._log_flags |= LOG_SERVICES_READY
                 return True
             else:
                 # Reset flag if services become unavailable
-                if hasattr(self, '_services_ready_logged'):
-                    self._services_ready_logged = False
+                self._log_flags &= ~LOG_SERVICES_READY
                 # Only log at debug level to avoid spam - detailed info already logged above
                 return False
                 
@@ -277,8 +474,32 @@ class MonitorService:
             logger.error(f"Error checking service readiness: {e}")
             return False
     
+    @staticmethod
+    def _port_listening_from_proc(port: int) -> Optional[bool]:
+        """Look for a LISTEN socket on the port in /proc/net/tcp{,6}; None if neither table is readable"""
+        suffix = f":{port:04X}"
+        readable = False
+        for path in ('/proc/net/tcp', '/proc/net/tcp6'):
+            try:
+                with open(path) as f:
+                    readable = True
+                    next(f, None)  # Header
+                    for line in f:
+                        # sl local_address rem_address st ... (st 0A == LISTEN)
+                        parts = line.split(None, 4)
+                        if len(parts) > 3 and parts[3] == '0A' and parts[1].endswith(suffix):
+                            return True
+            except OSError:
+                continue
+        return False if readable else None
+    
     def _check_port_listening(self, port: int) -> bool:
-        """Check if a port is listening using ss or netstat as fallback"""
+        """Check if a port is listening via /proc/net/tcp, using ss or netstat as fallback"""
+        # Reading the kernel's socket tables avoids a fork+exec of ss/netstat per check
+        listening = self._port_listening_from_proc(port)
+        if listening is not None:
+            return listening
+        
         try:
             # Try ss first (more common on modern systems)
             result = subprocess.run(
@@ -317,6 +538,7 @@ class MonitorService:
             if result and result.get('success'):
                 self.session_started = True
                 logger.info(f"Session marked as started for instance {self.instance_id}")
+                self.wake()  # Switch to the running-session checks without waiting out the tick
             else:
                 logger.warning(f"Failed to mark session as started: {result.get('error', 'Unknown error') if result else 'No response'}")
                 
@@ -405,209 +627,260 @@ class MonitorService:
             self.is_charging = True
             logger.info(f"Resumed charging for user {self.user_id}")
     
+    def _fix_supervisor_socket_perms(self):
+        """Give the watcher group access to the supervisor socket (requires root, but worth trying)"""
+        # This is a workaround if supervisord.conf chown doesn't work; the socket keeps
+        # its ownership once set, so this only runs at startup
+        try:
+            self._watcher_gid = grp.getgrnam('watcher').gr_gid
+        except KeyError:
+            self._watcher_gid = None
+        
+        if not os.path.exists(SUPERVISOR_SOCKET):
+            return
+        try:
+            os.chmod(SUPERVISOR_SOCKET, 0o770)
+            if self._watcher_gid is not None:
+                os.chown(SUPERVISOR_SOCKET, -1, self._watcher_gid)
+        except OSError as e:
+            # Can't fix permissions, continue anyway - they might already be enough
+            logger.info(f"Could not adjust supervisor socket permissions: {e}")
+    
+    def _supervisor_proxy(self) -> xmlrpc.client.ServerProxy:
+        """XML-RPC proxy to supervisord over its Unix socket (the host part of the URL is ignored)"""
+        if self._supervisor is None:
+            self._supervisor = xmlrpc.client.ServerProxy('http://localhost/RPC2', transport=_UnixSocketTransport())
+        return self._supervisor
+    
+    def _get_supervisor_states(self) -> Optional[Dict[str, str]]:
+        """Map supervisor program name -> state name (e.g. RUNNING), or None if supervisor can't be queried"""
+        try:
+            infos = self._supervisor_proxy().supervisor.getAllProcessInfo()
+            return {info['name']: info['statename'] for info in infos}
+        except Exception as e:
+            if not self._log_flags & LOG_SUPERVISOR_RPC_FAILED:
+                logger.info(f"supervisor XML-RPC unavailable: {e}. Trying supervisorctl.")
+                self._log_flags |= LOG_SUPERVISOR_RPC_FAILED
+        
+        # Fallback: supervisorctl status - must specify config file to use Unix socket
+        result = subprocess.run(
+            SUPERVISORCTL + ['status'],
+            capture_output=True,
+            text=True,
+            timeout=5
+        )
+        
+        if result.returncode != 0:
+            # supervisorctl failed - log at info level first time, then debug
+            error_msg = result.stderr.strip() if result.stderr else "No error message"
+            output_msg = result.stdout.strip() if result.stdout else "No output"
+            if not self._log_flags & LOG_SUPERVISORCTL_FAILED:
+                logger.info(f"supervisorctl unavailable (returncode={result.returncode}): {error_msg}. Using fallback checks.")
+                if output_msg:
+                    logger.info(f"supervisorctl stdout: {output_msg}")
+                self._log_flags |= LOG_SUPERVISORCTL_FAILED
+            else:
+                logger.debug(f"supervisorctl unavailable (returncode={result.returncode}): {error_msg}. Using fallback checks.")
+            return None
+        
+        # Lines look like: "jupyter    RUNNING   pid 42, uptime 0:01:00"
+        states = {}
+        for line in result.stdout.splitlines():
+            parts = line.split()
+            if len(parts) >= 2:
+                states[parts[0]] = parts[1]
+        return states
+    
+    def _restart_supervisor_processes(self, names: List[str]):
+        """Restart supervisor programs in one round-trip (stop if still starting/backing off, then start)"""
+        # The stops run one after another and each may block for up to stopwaitsecs, so
+        # allow for all of them; timing out here would restart the programs twice
+        restart_timeout = SUPERVISOR_STOPWAITSECS * len(names) + SUPERVISOR_RPC_TIMEOUT
+        try:
+            # One multicall: stop everything (waiting for each to exit), then start everything.
+            # Faults come back as result entries; stopping a program that isn't running is fine.
+            # Restarts are rare, so they get their own proxy rather than a longer timeout on the shared one.
+            calls = ([{'methodName': 'supervisor.stopProcess', 'params': [name, True]} for name in names] +
+                     [{'methodName': 'supervisor.startProcess', 'params': [name, False]} for name in names])
+            proxy = xmlrpc.client.ServerProxy('http://localhost/RPC2', transport=_UnixSocketTransport(restart_timeout))
+            with proxy:
+                results = proxy.system.multicall(calls)
+            failed = [name for name, result in zip(names, results[len(names):])
+                      if isinstance(result, dict) and 'faultCode' in result]
+            if not failed:
+                return
+            logger.debug(f"supervisor XML-RPC start of {', '.join(failed)} failed. Trying supervisorctl.")
+            names = failed
+        except Exception as e:
+            logger.debug(f"supervisor XML-RPC restart of {', '.join(names)} failed: {e}. Trying supervisorctl.")
+        
+        subprocess.run(SUPERVISORCTL + ['restart', *names], timeout=restart_timeout, capture_output=True)
+    
     def _check_process_health(self):
         """Check if processes are running via supervisorctl, with fallback to socket checks"""
         supervisorctl_available = False
         
         try:
-            # Ensure socket has correct permissions (watcher user needs group access)
-            # This is a workaround if supervisord.conf chown doesn't work
-            socket_path = '/var/run/supervisor.sock'
-            if os.path.exists(socket_path):
-                try:
-                    # Try to fix permissions if we can (requires root, but worth trying)
-                    os.chmod(socket_path, 0o770)
-                    # Try to change group to watcher (requires root)
-                    import grp
-                    try:
-                        watcher_gid = grp.getgrnam('watcher').gr_gid
-                        os.chown(socket_path, -1, watcher_gid)
-                    except (OSError, KeyError):
-                        pass  # Can't change ownership, but permissions might be enough
-                except (OSError, PermissionError):
-                    pass  # Can't fix permissions, continue anyway
-            
-            # Check supervisorctl status - must specify config file to use Unix socket
-            result = subprocess.run(
-                ['supervisorctl', '-c', '/etc/supervisor/conf.d/supervisord.conf', 'status'],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
+            # Check process states - XML-RPC over the supervisor socket, supervisorctl as fallback
+            states = self._get_supervisor_states()
             
-            if result.returncode == 0:
+            if states is not None:
                 supervisorctl_available = True
                 # Check if critical processes are running
-                output = result.stdout
-                jupyter_running = 'jupyter' in output and 'RUNNING' in output
-                python_server_running = 'python_server' in output and 'RUNNING' in output
-                turn_server_running = not self.start_turn or ('turn_server' in output and 'RUNNING' in output)
+                jupyter_running = states.get('jupyter') == 'RUNNING'
+                python_server_running = states.get('python_server') == 'RUNNING'
+                turn_server_running = not self.start_turn or states.get('turn_server') == 'RUNNING'
                 
                 # Log what we found for debugging
-                if not hasattr(self, '_last_supervisorctl_check'):
+                if not self._log_flags & LOG_SUPERVISOR_STATES:
                     logger.info(f"supervisorctl check: jupyter={'RUNNING' if jupyter_running else 'NOT RUNNING'}, "
                               f"python_server={'RUNNING' if python_server_running else 'NOT RUNNING'}, "
                               f"turn_server={'RUNNING' if turn_server_running else 'NOT RUNNING'}")
-                    self._last_supervisorctl_check = True
+                    self._log_flags |= LOG_SUPERVISOR_STATES
                 
+                restart = []
                 if not jupyter_running:
                     logger.warning("Jupyter server not running (supervisorctl), attempting restart")
-                    subprocess.run(['supervisorctl', '-c', '/etc/supervisor/conf.d/supervisord.conf', 'restart', 'jupyter'], timeout=10, capture_output=True)
+                    restart.append('jupyter')
                 
                 if not python_server_running:
                     logger.warning("Python server not running (supervisorctl), attempting restart")
-                    subprocess.run(['supervisorctl', '-c', '/etc/supervisor/conf.d/supervisord.conf', 'restart', 'python_server'], timeout=10, capture_output=True)
+                    restart.append('python_server')
                 
-                if not turn_server_running and self.start_turn:
+                if not turn_server_running:
                     logger.warning("TURN server not running (supervisorctl), attempting restart")
-                    subprocess.run(['supervisorctl', '-c', '/etc/supervisor/conf.d/supervisord.conf', 'restart', 'turn_server'], timeout=10, capture_output=True)
+                    restart.append('turn_server')
+                
+                if restart:
+                    self._restart_supervisor_processes(restart)
 
                 # If supervisorctl shows RUNNING, trust it even if socket checks might fail
                 # (services might be starting up and not ready to accept connections yet)
                 return jupyter_running and python_server_running and turn_server_running
-            else:
-                # supervisorctl failed - log at info level first time, then debug
-                error_msg = result.stderr.strip() if result.stderr else "No error message"
-                output_msg = result.stdout.strip() if result.stdout else "No output"
-                if not hasattr(self, '_supervisorctl_failed_logged'):
-                    logger.info(f"supervisorctl unavailable (returncode={result.returncode}): {error_msg}. Using fallback checks.")
-                    if output_msg:
-                        logger.info(f"supervisorctl stdout: {output_msg}")
-                    self._supervisorctl_failed_logged = True
-                else:
-                    logger.debug(f"supervisorctl unavailable (returncode={result.returncode}): {error_msg}. Using fallback checks.")
             
         except subprocess.TimeoutExpired:
-            if not hasattr(self, '_supervisorctl_timeout_logged'):
+            if not self._log_flags & LOG_SUPERVISORCTL_TIMEOUT:
                 logger.info("supervisorctl command timed out, using fallback checks")
-                self._supervisorctl_timeout_logged = True
+                self._log_flags |= LOG_SUPERVISORCTL_TIMEOUT
             else:
                 logger.debug("supervisorctl command timed out, using fallback checks")
         except Exception as e:
-            if not hasattr(self, '_supervisorctl_error_logged'):
+            if not self._log_flags & LOG_SUPERVISORCTL_ERROR:
                 logger.info(f"supervisorctl error: {e}, using fallback checks")
-                self._supervisorctl_error_logged = True
+                self._log_flags |= LOG_SUPERVISORCTL_ERROR
             else:
                 logger.debug(f"supervisorctl error: {e}, using fallback checks")
         
         # Fallback: Use socket checks (most reliable) and process checks
         return self._check_processes_via_socket_and_ps()
     
+    def _find_service_processes(self) -> Tuple[bool, bool, bool]:
+        """Scan running processes once for (jupyter, python server, TURN server), stopping early when all are found
+        
+        The result is reused for process_scan_ttl seconds, so the TURN check and the
+        socket/ps fallback in the same cycle share one scan.
+        """
+        scanned_at, found = self._process_scan
+        now = time.monotonic()
+        if found is not None and now - scanned_at < self.process_scan_ttl:
+            return found
+        
+        if psutil is None:
+            raise ImportError("psutil is not installed")
+        
+        # A service that isn't required counts as found, so the all-found break and
+        # the callers only ever need to test the three flags
+        jupyter_found = False
+        python_found = False
+        turn_found = not self.start_turn
+        
+        # process_iter() skips processes that vanish mid-scan; only name and cmdline are read
+        for proc in psutil.process_iter(['name', 'cmdline']):
+            info = proc.info
+            cmdline = info.get('cmdline') or ()
+            name = (info.get('name') or '').lower()
+            if not cmdline and not name:
+                continue  # Nothing to match (e.g. access denied)
+            
+            # Check for Jupyter
+            if not jupyter_found:
+                if 'jupyter' in name or _cmdline_has(cmdline, ('jupyter',), ignore_case=True):
+                    jupyter_found = True
+            
+            # Check for Python server - look for multiple patterns
+            if not python_found:
+                if (_cmdline_has(cmdline, PYTHON_SERVER_NEEDLES) or
+                    ('python' in name and _cmdline_has(cmdline, ('run_modular',)))):
+                    python_found = True
+            
+            # Check for TURN server
+            if not turn_found:
+                if _cmdline_has(cmdline, ('turnserver',)):
+                    turn_found = True
+            
+            if jupyter_found and python_found and turn_found:
+                break
+        
+        found = (jupyter_found, python_found, turn_found)
+        self._process_scan = (now, found)
+        return found
+    
     def _check_processes_via_socket_and_ps(self):
         """Fallback: Check if processes are running via socket connections (most reliable) and psutil"""
-        # First, check sockets (most reliable method)
-        socket_check_passed = self._check_services_ready()
+        # First, check sockets (most reliable method); this runs in an executor thread,
+        # so hand the async probe to the monitor's event loop and wait for it (bounded, so a
+        # stalled probe can't block this thread and the monitor loop awaiting it forever)
+        future = asyncio.run_coroutine_threadsafe(self._check_services_ready(), self._loop)
+        try:
+            socket_check_passed = future.result(timeout=SOCKET_CHECK_TIMEOUT)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            logger.warning(f"Service socket check timed out after {SOCKET_CHECK_TIMEOUT:.0f}s, treating it as failed")
+            socket_check_passed = False
+        
+        # Then one process scan, whichever way the socket check went
+        try:
+            jupyter_found, python_found, turn_found = self._find_service_processes()
+        except Exception as e:
+            if socket_check_passed:
+                logger.debug("Error checking processes via psutil: %s, but socket check passed", e)
+            else:
+                logger.error(f"Error checking processes via psutil: {e}")
+            # If we can't check processes, trust socket check (more reliable)
+            return socket_check_passed
         
         if socket_check_passed:
             # Services are accepting connections - they're definitely running
-            # Only log process check failures at debug level since socket check passed
-            try:
-                import psutil
-                processes = list(psutil.process_iter(['name', 'cmdline', 'pid', 'username']))
-                
-                jupyter_found = False
-                python_found = False
-                turn_found = not self.start_turn # True if not required
-                
-                for proc in processes:
-                    try:
-                        cmdline = proc.info.get('cmdline') or []
-                        cmdline_str = ' '.join(str(c) for c in cmdline)
-                        name = proc.info.get('name', '').lower()
-                        
-                        # Check for Jupyter
-                        if not jupyter_found:
-                            if 'jupyter' in name or 'jupyter' in cmdline_str.lower():
-                                jupyter_found = True
-                        
-                        # Check for Python server - look for multiple patterns
-                        if not python_found:
-                            if ('run_modular.py' in cmdline_str or 
-                                'server_modular' in cmdline_str or
-                                ('python' in name and 'run_modular' in cmdline_str)):
-                                python_found = True
-
-                        # Check for TURN server
-                        if not turn_found and self.start_turn:
-                            if 'turnserver' in cmdline_str:
-                                turn_found = True
-                    except (psutil.NoSuchProcess, psutil.AccessDenied):
-                        continue
-                
-                # Only log if socket check passed but process check failed (unusual case)
-                if not jupyter_found:
-                    logger.debug("Jupyter process not found via psutil (but socket check passed - service is running)")
-                if not python_found:
-                    logger.debug("Python server process not found via psutil (but socket check passed - service is running)")
-                if not turn_found and self.start_turn:
-                    logger.debug("TURN server process not found via psutil (but socket check passed for others)")
-                
-                # Return socket check result (more reliable)
-                return socket_check_passed and turn_found
-                
-            except Exception as e:
-                logger.debug(f"Error checking processes via psutil: {e}, but socket check passed")
-                return socket_check_passed  # Trust socket check
-        else:
-            # Socket check failed - services might not be running, or might be starting up
-            # Check processes to see if they exist but aren't listening yet
-            try:
-                import psutil
-                processes = list(psutil.process_iter(['name', 'cmdline', 'pid', 'username']))
-                
-                jupyter_found = False
-                python_found = False
-                turn_found = not self.start_turn # True if not required
-                
-                for proc in processes:
-                    try:
-                        cmdline = proc.info.get('cmdline') or []
-                        cmdline_str = ' '.join(str(c) for c in cmdline)
-                        name = proc.info.get('name', '').lower()
-                        
-                        # Check for Jupyter
-                        if not jupyter_found:
-                            if 'jupyter' in name or 'jupyter' in cmdline_str.lower():
-                                jupyter_found = True
-                        
-                        # Check for Python server - look for multiple patterns
-                        if not python_found:
-                            if ('run_modular.py' in cmdline_str or 
-                                'server_modular' in cmdline_str or
-                                ('python' in name and 'run_modular' in cmdline_str)):
-                                python_found = True
-
-                        # Check for TURN server
-                        if not turn_found and self.start_turn:
-                            if 'turnserver' in cmdline_str:
-                                turn_found = True
-                    except (psutil.NoSuchProcess, psutil.AccessDenied):
-                        continue
-                
-                # If processes are found but sockets aren't ready, they might be starting up
-                # Trust that processes are running if found (give them time to start listening)
-                if jupyter_found and python_found and turn_found:
-                    # Processes exist - trust they're running even if sockets not ready yet
-                    if not hasattr(self, '_processes_found_but_sockets_not_ready'):
-                        logger.info("Processes found (jupyter, python_server, turn_server) but sockets not ready yet - services may be starting up")
-                        self._processes_found_but_sockets_not_ready = True
-                    return True  # Trust process existence
-                else:
-                    # Processes not found - services are definitely not running
-                    if not jupyter_found:
-                        logger.warning("Jupyter server not running: process not found and port 8888 not accepting connections")
-                    if not python_found:
-                        python_port = int(os.getenv('VAST_TCP_PORT_70000', '8765'))
-                        logger.warning(f"Python server not running: process not found and port {python_port} not accepting connections")
-                    if not turn_found and self.start_turn:
-                        logger.warning("TURN server not running: process not found")
-                    
-                    return False
-                
-            except Exception as e:
-                logger.error(f"Error checking processes via psutil: {e}")
-                # If we can't check processes, trust socket check (more reliable)
-                return socket_check_passed
+            # Only log if socket check passed but process check failed (unusual case)
+            if not jupyter_found:
+                logger.debug("Jupyter process not found via psutil (but socket check passed - service is running)")
+            if not python_found:
+                logger.debug("Python server process not found via psutil (but socket check passed - service is running)")
+            if not turn_found:
+                logger.debug("TURN server process not found via psutil (but socket check passed for others)")
+            
+            # Return socket check result (more reliable)
+            return turn_found
+        
+        # Socket check failed - services might not be running, or might be starting up.
+        # If processes are found but sockets aren't ready, they might be starting up:
+        # trust that processes are running if found (give them time to start listening)
+        if jupyter_found and python_found and turn_found:
+            # Processes exist - trust they're running even if sockets not ready yet
+            if not self._log_flags & LOG_PROCESSES_WITHOUT_SOCKETS:
+                logger.info("Processes found (jupyter, python_server, turn_server) but sockets not ready yet - services may be starting up")
+                self._log_flags |= LOG_PROCESSES_WITHOUT_SOCKETS
+            return True  # Trust process existence
+        
+        # Processes not found - services are definitely not running
+        if not jupyter_found:
+            logger.warning("Jupyter server not running: process not found and port 8888 not accepting connections")
+        if not python_found:
+            logger.warning(f"Python server not running: process not found and port {self.python_port} not accepting connections")
+        if not turn_found:
+            logger.warning("TURN server not running: process not found")
+        
+        return False
     
     async def terminate_session(self, reason: str):
         """Terminate the session via HTTP call, then exit"""
@@ -627,112 +900,95 @@ class MonitorService:
         except Exception as e:
             logger.error(f"Error terminating session: {e}")
         
+        # The session is over, so outstanding background writes don't matter; release the
+        # pooled connections before exiting
+        await self.close(cancel_pending=True)
+        
         # Exit the monitoring service (container will stop)
         sys.exit(0)
     
+    async def _fetch_public_ip(self, source: str, url: str, timeout: httpx.Timeout) -> str:
+        """GET a plain-text public IP from one source, retrying once on a connection failure or timeout"""
+        for attempt in range(2):
+            try:
+                response = await self._get_http().get(url, headers={'Accept': 'text/plain'}, timeout=timeout)
+                break
+            except httpx.TransportError:
+                if attempt:
+                    raise
+        response.raise_for_status()
+        public_ip = response.text.strip()
+        if not public_ip:
+            raise ValueError(f"empty response from {source}")
+        logger.info(f"Detected public IP from {source}: {public_ip}")
+        return public_ip
+    
+    async def _detect_public_ip(self) -> Optional[str]:
+        """Ask the DigitalOcean metadata service and ifconfig.co at once; the first answer wins"""
+        pending = {
+            asyncio.create_task(self._fetch_public_ip('metadata', PUBLIC_IP_METADATA_URL, PUBLIC_IP_METADATA_TIMEOUT)),
+            asyncio.create_task(self._fetch_public_ip('ifconfig.co', PUBLIC_IP_FALLBACK_URL, PUBLIC_IP_FALLBACK_TIMEOUT)),
+        }
+        error = None
+        deadline = time.monotonic() + PUBLIC_IP_DETECT_TIMEOUT
+        try:
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    error = error or f"timed out after {PUBLIC_IP_DETECT_TIMEOUT:g}s"
+                    break
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+        
+        logger.warning(f"Could not detect public IP: {str(error) or type(error).__name__}")
+        return None
+    
     async def update_session_ports_and_ip(self):
         """Update session document with ports and public IP from environment variables"""
         try:
-            # Read VastAI identity port mappings from environment
-            # IMPORTANT: VastAI uses identity port mapping - the port you bind to internally is the same as the external port
-            # VAST_TCP_PORT_70000 → Python server (internal = external, e.g., 27804 = 27804)
-            # VAST_UDP_PORT_70001 → TURN server (internal = external, e.g., 27126 = 27126)
-            # VAST_TCP_PORT_70002 → Jupyter (internal = external, e.g., 27374 = 27374)
-            # VAST_TCP_PORT_22 → SSH (internal = external)
-            vast_tcp_port_70000 = os.getenv('VAST_TCP_PORT_70000')  # Python server
-            vast_udp_port_70001 = os.getenv('VAST_UDP_PORT_70001')  # TURN server
-            vast_tcp_port_70002 = os.getenv('VAST_TCP_PORT_70002')  # Jupyter
-            vast_tcp_port_22 = os.getenv('VAST_TCP_PORT_22')  # SSH
-            public_ip = os.getenv('PUBLIC_IPADDR', '')
+            public_ip = self._public_ip
             
             # If PUBLIC_IPADDR is "auto" or empty, try to detect it
             if not public_ip or public_ip == "auto":
-                try:
-                    # Try DigitalOcean metadata first
-                    import urllib.request
-                    try:
-                        with urllib.request.urlopen('http://169.254.169.254/metadata/v1/interfaces/public/0/ipv4/address', timeout=2) as response:
-                            public_ip = response.read().decode('utf-8').strip()
-                            logger.info(f"Detected public IP from metadata: {public_ip}")
-                    except Exception:
-                        # Fallback to external service
-                        try:
-                            with urllib.request.urlopen('https://ifconfig.co', timeout=3) as response:
-                                public_ip = response.read().decode('utf-8').strip()
-                                logger.info(f"Detected public IP from ifconfig.co: {public_ip}")
-                        except Exception as e:
-                            logger.warning(f"Could not detect public IP: {e}")
-                            public_ip = None
-                except Exception as e:
-                    logger.warning(f"Error detecting public IP: {e}")
-                    public_ip = None
-            
-            # Build ports array with objects containing label, internal, external, and protocol
-            # IMPORTANT: VastAI uses identity port mapping - internal and external ports are the same
-            # Format: [{"label": "python", "internal": 27804, "external": 27804, "protocol": "tcp"}, ...]
-            ports = []
-            
-            # Python server: VAST_TCP_PORT_70000 is the identity port (internal = external)
-            if vast_tcp_port_70000:
-                try:
-                    port = int(vast_tcp_port_70000)
-                    ports.append({
-                        "label": "python",
-                        "internal": port,  # Identity mapping: internal = external
-                        "external": port,
-                        "protocol": "tcp"
-                    })
-                except ValueError:
-                    logger.warning(f"Invalid VAST_TCP_PORT_70000: {vast_tcp_port_70000}")
-            
-            # TURN server: VAST_UDP_PORT_70001 is the identity port (internal = external)
-            if vast_udp_port_70001:
-                try:
-                    port = int(vast_udp_port_70001)
-                    ports.append({
-                        "label": "turn",
-                        "internal": port,  # Identity mapping: internal = external
-                        "external": port,
-                        "protocol": "udp"
-                    })
-                except ValueError:
-                    logger.warning(f"Invalid VAST_UDP_PORT_70001: {vast_udp_port_70001}")
-            
-            # Jupyter: VAST_TCP_PORT_70002 is the identity port (internal = external)
-            if vast_tcp_port_70002:
-                try:
-                    port = int(vast_tcp_port_70002)
-                    ports.append({
-                        "label": "jupyter",
-                        "internal": port,  # Identity mapping: internal = external
-                        "external": port,
-                        "protocol": "tcp"
-                    })
-                except ValueError:
-                    logger.warning(f"Invalid VAST_TCP_PORT_70002: {vast_tcp_port_70002}")
-            
-            # SSH: VAST_TCP_PORT_22 is the identity port (internal = external)
-            if vast_tcp_port_22:
-                try:
-                    port = int(vast_tcp_port_22)
-                    ports.append({
-                        "label": "ssh",
-                        "internal": port,  # Identity mapping: internal = external
-                        "external": port,
-                        "protocol": "tcp"
-                    })
-                except ValueError:
-                    logger.warning(f"Invalid VAST_TCP_PORT_22: {vast_tcp_port_22}")
+                public_ip = await self._detect_public_ip()
+                if public_ip:
+                    self._public_ip = public_ip  # Don't probe again on later calls
+            
+            # All ports go out together in the single updateSessionPorts call below
+            ports = self._session_ports
+            
+            # Skip the call when nothing changed since the last successful update
+            payload = (tuple(sorted((p['label'], p['external']) for p in ports)), public_ip)
+            if payload == self._last_ports_payload:
+                logger.debug("Session ports and IP unchanged, not updating")
+                return
             
             # Only update if we have at least ports or IP
             if ports or public_ip:
-                result = await self._call_function('updateSessionPorts', {
-                    'instanceId': self.instance_id,
-                    'publicIp': public_ip if public_ip else None,
-                    'ports': ports if ports else None,
-                })
+                # Encode once per distinct payload; resends of the same data reuse the bytes
+                if self._ports_body is None or self._ports_body[0] != payload:
+                    self._ports_body = (payload, self._encode_call({
+                        'instanceId': self.instance_id,
+                        'publicIp': public_ip if public_ip else None,
+                        'ports': ports if ports else None,
+                    }))
+                # Runs in the background, so a transient failure can be retried with
+                # exponential backoff (1s, 2s, ... capped) plus jitter without holding up the loop
+                for attempt in range(self.ports_update_attempts):
+                    if attempt:
+                        await asyncio.sleep(min(self.ports_retry_max_delay, 2 ** (attempt - 1)) + random.uniform(0, 0.5))
+                    result = await self._call_function('updateSessionPorts', body=self._ports_body[1])
+                    if result and result.get('success'):
+                        break
                 
                 if result and result.get('success'):
+                    self._last_ports_payload = payload
                     logger.info(f"Session ports and IP updated: ports={ports}, publicIp={public_ip}")
                 else:
                     logger.warning(f"Failed to update session ports/IP: {result.get('error', 'Unknown error') if result else 'No response'}")
@@ -748,43 +1004,66 @@ class MonitorService:
 
         await asyncio.sleep(5)  # Wait 5 seconds to ensure all services are started
         
-        # Update session ports and IP from environment variables on startup
-        # This ensures the session document has the correct external ports and IP
-        await self.update_session_ports_and_ip()
+        # Startup updates - independent writes the loop doesn't need the results of, so they
+        # run in the background (concurrently, on the pooled client) while the first cycle starts:
+        # - session ports and IP from environment variables, so the session document has
+        #   the correct external ports and IP
+        # - TURN credentials in Firestore, so the frontend can retrieve them for WebRTC connection
+        self._spawn(self.update_session_ports_and_ip())
+        self._spawn(self.update_turn_credentials())
         
-        # Update TURN credentials in Firestore on startup
-        # This ensures the frontend can retrieve them for WebRTC connection
-        await self.update_turn_credentials()
+        loop = self._loop = asyncio.get_running_loop()
+        next_deadline = loop.time()
+        last_health = last_heartbeat = last_credits = float('-inf')
+        process_health_ok = False
+        last_state = None
+        
+        def due(now: float, last: float, interval: float) -> bool:
+            # 1s of slack so a tick that lands a hair early doesn't push a check a whole tick back
+            return now - last >= interval - 1
         
         while True:
+            now = loop.time()
+            checks = []
+            
             try:
-                # Check process health (logs warnings only if services are actually down)
-                process_health_ok = self._check_process_health()
+                # The heartbeat check is independent of everything else this cycle, so its
+                # round trip overlaps the process health check and the credits check
+                if due(now, last_heartbeat, self.heartbeat_interval):
+                    last_heartbeat = now
+                    checks.append(asyncio.create_task(self._check_heartbeat()))
                 
-                # If session is still provisioning, check if services are ready
+                # Check process health (logs warnings only if services are actually down);
+                # it shells out to supervisorctl, so keep it off the event loop
+                if due(now, last_health, self.process_health_interval):
+                    last_health = now
+                    process_health_ok = await loop.run_in_executor(None, self._check_process_health)
+                
+                # If session is still provisioning, check if services are ready (every tick)
                 if not self.session_started:
-                    services_ready = self._check_services_ready()
+                    services_ready = await self._check_services_ready()
                     
                     # If supervisorctl shows processes as RUNNING, trust that even if socket checks fail
                     # (services might be starting up and not ready to accept connections yet)
                     if process_health_ok and not services_ready:
                         # Processes are running but sockets not ready - give them more time
-                        if not hasattr(self, '_services_starting_logged'):
+                        if not self._log_flags & LOG_SERVICES_STARTING:
                             logger.info("Services are running (supervisorctl) but not yet accepting connections - waiting for them to fully start")
-                            self._services_starting_logged = True
+                            self._log_flags |= LOG_SERVICES_STARTING
                         # Don't mark as started yet, but also don't log warning
                     elif services_ready:
-                        await self._mark_session_started()
+                        # Sets session_started when it lands; a later tick retries if it failed
+                        if self._start_task is None or self._start_task.done():
+                            self._start_task = self._spawn(self._mark_session_started())
                     elif not process_health_ok:
                         # Services not ready and process health check failed
                         logger.warning("Services not ready yet - waiting for Jupyter and Python server to start")
                 
-                # If session is started/running, check credits remaining
-                if self.session_started:
-                    await self._check_credits_remaining()
-                
-                # Check heartbeat
-                await self._check_heartbeat()
+                # If session is started/running, check credits remaining (alongside the heartbeat);
+                # billing barely moves minute to minute, so this runs on a slower cadence
+                if self.session_started and due(now, last_credits, self.credits_check_interval):
+                    last_credits = now
+                    checks.append(self._check_credits_remaining())
                 
             except KeyboardInterrupt:
                 logger.info("Monitoring service interrupted by user")
@@ -792,13 +1071,39 @@ class MonitorService:
             except Exception as e:
                 logger.error(f"Error in monitoring loop: {e}")
                 await asyncio.sleep(0.1)  # Continue monitoring despite errors
+            finally:
+                # Always collect this cycle's checks, so an error above can't leave the
+                # heartbeat task running with nothing holding a reference to it
+                if checks:
+                    await asyncio.gather(*checks, return_exceptions=True)
 
-            await asyncio.sleep(60)  # Check every minute
+            # Poll quickly right after anything changed (idle/charging flipped, session started,
+            # services went down) and back off while things stay the same
+            state = (self.is_charging, self.grace_period_start is not None, self.session_started, process_health_ok)
+            if state != last_state:
+                self.heartbeat_interval = self.heartbeat_interval_min
+            else:
+                self.heartbeat_interval = min(self.heartbeat_interval * self.heartbeat_backoff, self.monitor_interval)
+            last_state = state
+            
+            # Tick on a schedule measured from the start of each cycle so slow cycles don't
+            # push it back; after an overrun, run again now and re-anchor from here
+            next_deadline += self.heartbeat_interval if self.session_started else self.services_ready_interval
+            delay = next_deadline - loop.time()
+            if delay < 0:
+                next_deadline -= delay
+                delay = 0
+            # wake() ends the wait early (e.g. the session just started); re-anchor from then
+            if await self._sleep_or_wake(delay):
+                next_deadline = loop.time()
 
 async def main():
     """Main entry point for monitoring service"""
     monitor = MonitorService()
-    await monitor.monitor_loop()
+    try:
+        await monitor.monitor_loop()
+    finally:
+        await monitor.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -6,6 +6,7 @@ This script sets up the Python path correctly and runs the server.
 import sys
 import os
 import datetime
+import subprocess
 import tempfile
 
 # Get the directory containing this script
@@ -41,46 +42,64 @@ except (OSError, PermissionError) as e:
 timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
 log_file = os.path.join(logs_dir, f"server_run_{timestamp}.log")
 
-# Redirect stdout and stderr to the log file
-class Logger:
-    def __init__(self, filename):
-        self.terminal = sys.stdout
+class _TeeFallback:
+    """Wraps sys.stdout/sys.stderr; if tee goes away, puts the original fds back and retries."""
+
+    def __init__(self, stream, saved_fds):
+        self._stream = stream
+        self._saved_fds = saved_fds
+
+    def _restore(self):
+        for fd, saved in self._saved_fds:
+            os.dup2(saved, fd)
+
+    def write(self, text):
         try:
-            self.log = open(filename, 'a', encoding='utf-8')
-            self.log_enabled = True
-        except (OSError, PermissionError) as e:
-            # If we can't open the log file, just use terminal
-            print(f"WARNING: Cannot write to log file {filename}: {e}", file=sys.stderr)
-            self.log = None
-            self.log_enabled = False
-    
-    def write(self, message):
-        self.terminal.write(message)
-        if self.log_enabled and self.log:
-            try:
-                self.log.write(message)
-                self.log.flush()
-            except (OSError, PermissionError):
-                # If write fails, disable logging and continue
-                self.log_enabled = False
-                if self.log:
-                    try:
-                        self.log.close()
-                    except:
-                        pass
-                    self.log = None
-    
+            return self._stream.write(text)
+        except BrokenPipeError:
+            self._restore()
+            return self._stream.write(text)
+
     def flush(self):
-        self.terminal.flush()
-        if self.log_enabled and self.log:
-            try:
-                self.log.flush()
-            except (OSError, PermissionError):
-                pass
+        try:
+            self._stream.flush()
+        except BrokenPipeError:
+            self._restore()
+            self._stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+# Copy stdout and stderr to the log file through `tee` at the file-descriptor level, so
+# writes go straight to the kernel (no Python-level tee or per-write flush) and output
+# from child processes is captured too
+def tee_output(filename):
+    try:
+        # Check up front so an unwritable file falls back to console-only output
+        open(filename, 'a').close()
+    except (OSError, PermissionError) as e:
+        print(f"WARNING: Cannot write to log file {filename}: {e}", file=sys.stderr)
+        return
+    try:
+        # tee inherits the original stdout; its own session keeps terminal signals from
+        # killing it before the server has finished writing
+        tee = subprocess.Popen(['tee', '-a', filename], stdin=subprocess.PIPE, start_new_session=True)
+    except OSError as e:
+        print(f"WARNING: Cannot start tee for log file {filename}: {e}", file=sys.stderr)
+        return
+    sys.stdout.flush()
+    sys.stderr.flush()
+    # Keep the original fds so output survives tee dying (otherwise every print and
+    # traceback would raise BrokenPipeError)
+    saved_fds = [(fd, os.dup(fd)) for fd in (sys.stdout.fileno(), sys.stderr.fileno())]
+    os.dup2(tee.stdin.fileno(), sys.stdout.fileno())
+    os.dup2(tee.stdin.fileno(), sys.stderr.fileno())
+    tee.stdin.close()  # fds 1 and 2 keep the pipe open; tee exits when this process does
+    sys.stdout = _TeeFallback(sys.stdout, saved_fds)
+    sys.stderr = _TeeFallback(sys.stderr, saved_fds)
 
 # Redirect stdout and stderr
-sys.stdout = Logger(log_file)
-sys.stderr = Logger(log_file)
+tee_output(log_file)
 
 # Add the script directory to Python path
 sys.path.insert(0, script_dir)
@@ -13,11 +13,14 @@ import os
 from aiohttp import web
 
 # Add the tensordock directory to Python path for imports
+# (once - the launchers may already have put it there)
 current_dir = os.path.dirname(os.path.abspath(__file__))
-sys.path.insert(0, current_dir)
+if current_dir not in sys.path:
+    sys.path.insert(0, current_dir)
 
 from core.config import ServerConfig
-from core.logging import setup_logging, debug_log
+from core.logging import setup_logging, debug_log, DEBUG_ENABLED
+from core.jupyter_message_factory import JupyterMessageFactory
 from webrtc.peer_manager import WebRTCPeerManager
 from webrtc.signaling import SignalingManager
 from jupyter_module import JupyterManager
@@ -173,8 +176,8 @@ class ModularTensorDockServer:
                             message.update(data)
                         else:
                             message['data'] = data
-                    # Forward to message broker
-                    asyncio.create_task(self.message_broker.route_message(message))
+                    # Forward to message broker (enqueue only; no task per message)
+                    self.message_broker.route_message(message)
                 handler.add_listener(action_name, listener)
             
             for act in actions:
@@ -252,10 +255,11 @@ class ModularTensorDockServer:
     async def broadcast(self, message, client_id=None):
         """Broadcast message to clients using WebRTC peer manager."""
         try:
-            debug_log(f"📤 [Server] Broadcasting message", {
-                "action": message.get('action'),
-                "exclude_client_id": client_id
-            })
+            if DEBUG_ENABLED:
+                debug_log(f"📤 [Server] Broadcasting message", {
+                    "action": message.get('action'),
+                    "exclude_client_id": client_id
+                })
             
             return self.peer_manager.broadcast_message(message, client_id)
             
@@ -269,10 +273,11 @@ class ModularTensorDockServer:
     async def send_to_client(self, client_id, message):
         """Send a message to a specific client."""
         try:
-            debug_log(f"📤 [Server] Sending message to client", {
-                "client_id": client_id,
-                "action": message.get('action')
-            })
+            if DEBUG_ENABLED:
+                debug_log(f"📤 [Server] Sending message to client", {
+                    "client_id": client_id,
+                    "action": message.get('action')
+                })
             return self.peer_manager.send_message(client_id, message)
         except Exception as e:
             debug_log(f"❌ [Server] Failed to send message to client", {
@@ -334,25 +339,19 @@ class ModularTensorDockServer:
                 debug_log(f"⚠️ [Server] No connected clients to broadcast to")
                 return
             
-            debug_log(f"📡 [Server] Broadcasting message to {len(connected_clients)} clients", {
-                "action": message.get('action'),
-                "client_count": len(connected_clients)
-            })
+            if DEBUG_ENABLED:
+                debug_log(f"📡 [Server] Broadcasting message to {len(connected_clients)} clients", {
+                    "action": message.get('action'),
+                    "client_count": len(connected_clients)
+                })
             
-            # Send message to each client
-            for client_id in connected_clients:
-                try:
-                    # Send the message through WebRTC using peer manager
-                    success = self.peer_manager.send_message(client_id, message)
-                    if not success:
-                        debug_log(f"⚠️ [Server] Failed to send message to client {client_id}")
-                except Exception as e:
-                    debug_log(f"❌ [Server] Error broadcasting to client {client_id}", {
-                        "error": str(e),
-                        "error_type": type(e).__name__
-                    })
+            # Fan out through the data channel manager so the frame is encoded once
+            sent_count = self.peer_manager.broadcast_message(message)
+            if sent_count < len(connected_clients):
+                debug_log(f"⚠️ [Server] Broadcast reached {sent_count} of {len(connected_clients)} clients")
             
-            debug_log(f"✅ [Server] Broadcast completed to {len(connected_clients)} clients")
+            if DEBUG_ENABLED:
+                debug_log(f"✅ [Server] Broadcast completed to {len(connected_clients)} clients")
             
         except Exception as e:
             debug_log(f"❌ [Server] Error in broadcast_to_all_clients", {
@@ -569,8 +568,8 @@ async def handle_websocket_kernel(request):
                     debug_log(f"📥 [WebSocket] Kernel message received", {
                         "connection_id": connection_id,
                         "kernel_id": kernel_id,
-                        "msg_type": data.get('header', {}).get('msg_type', 'unknown'),
-                        "msg_id": data.get('header', {}).get('msg_id', 'unknown')
+                        "msg_type": JupyterMessageFactory.dig(data, 'header', 'msg_type', 'unknown'),
+                        "msg_id": JupyterMessageFactory.dig(data, 'header', 'msg_id', 'unknown')
                     })
                     
                     # Handle client message
@@ -3,16 +3,12 @@ Canvas service for TensorDock server.
 Handles canvas data operations and client state management.
 """
 
+import os
 import json
 import datetime
 from typing import Dict, Any, Optional, List, Set
 from collections import defaultdict
 
-# Use absolute imports to avoid relative import issues
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 from core.logging import LoggerMixin, debug_log
 
 
@@ -8,11 +8,6 @@ import uuid
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 
-# Use absolute imports
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 from core.logging import LoggerMixin
 from core.config import ServerConfig
 
@@ -3,16 +3,12 @@ HTTP proxy service for TensorDock server.
 Handles sudo HTTP requests and Jupyter API proxying.
 """
 
+import asyncio
 import json
 import datetime
 from typing import Dict, Any, Optional
 import requests
 
-# Use absolute imports to avoid relative import issues
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 from core.logging import LoggerMixin, debug_log
 from core.config import ServerConfig
 
@@ -182,7 +178,6 @@ class HTTPProxyService(LoggerMixin):
                     debug_log(f"🌐 [HTTPProxy] Adding empty JSON body for {method} request")
             
             # Execute request based on method in a thread pool to avoid blocking
-            import asyncio
             loop = asyncio.get_event_loop()
             
             def make_request():
@@ -10,16 +10,12 @@ using a single broadcast callback with action 'ws_message'.
 """
 
 import asyncio
+import base64
 import json
 import datetime
 from typing import Dict, Any, Optional, Callable, Set
 from websockets.client import connect
 
-# Use absolute imports to avoid relative import issues
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 from core.logging import LoggerMixin, debug_log
 from core.config import ServerConfig
 
@@ -257,7 +253,6 @@ class WebSocketBridge(LoggerMixin):
                         data = message
                 elif isinstance(message, bytes):
                     # Binary message - pass through as base64 encoded string
-                    import base64
                     data = {
                         "type": "binary",
                         "data": base64.b64encode(message).decode('utf-8')
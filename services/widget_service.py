@@ -8,11 +8,6 @@ import datetime
 from typing import Dict, Any, Optional, List, Set
 from collections import defaultdict
 
-# Use absolute imports to avoid relative import issues
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 from core.logging import LoggerMixin, debug_log
 
 
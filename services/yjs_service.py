@@ -8,13 +8,9 @@ import uuid
 import datetime
 import requests
 from typing import Dict, Any, Optional, Set, List
+from pycrdt import merge_updates
 from pycrdt.websocket import WebsocketServer
 
-# Use absolute imports
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 from core.logging import LoggerMixin
 from core.config import ServerConfig
 
@@ -119,14 +115,32 @@ class YjsDocumentService(LoggerMixin):
         try:
             self.log_info(f"Received sync request for {document_id}")
             
-            # Send all stored updates for this document
-            if document_id in self.document_updates:
-                for update in self.document_updates[document_id]:
-                    await self._broadcast_document_update(document_id, update)
+            # Send all stored updates for this document as one merged frame
+            updates = self.document_updates.get(document_id)
+            if updates:
+                await self.broadcast_merged(document_id, updates)
             
         except Exception as e:
             self.log_error(f"Error handling sync request: {e}")
 
+    async def broadcast_merged(self, document_id: str, updates: List[bytes]):
+        """Merge several document updates and broadcast them as a single message."""
+        if len(updates) == 1:
+            await self._broadcast_document_update(document_id, updates[0])
+            return
+        
+        try:
+            merged = merge_updates(*updates)
+        except Exception as e:
+            self.log_warning(f"Could not merge {len(updates)} updates for {document_id}, sending individually: {e}")
+            for update in updates:
+                await self._broadcast_document_update(document_id, update)
+            return
+        
+        # Keep the compacted form so the next sync request is a single frame too
+        self.document_updates[document_id] = [merged]
+        await self._broadcast_document_update(document_id, merged)
+
     async def _broadcast_document_update(self, document_id: str, update: bytes):
         """Broadcast document update to all connected clients."""
         try:
@@ -0,0 +1,87 @@
+"""
+Tests for the worker manager's task dispatch.
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+# Imports resolve against the server root (the entry scripts live there)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from messaging.worker_manager import WorkerManager
+
+
+class WorkerManagerConcurrencyTest(unittest.IsolatedAsyncioTestCase):
+    """A burst of slow coroutine tasks must be spread across the workers."""
+
+    async def asyncSetUp(self):
+        self.manager = WorkerManager(max_workers=2)
+        self.running = 0
+        self.peak = 0
+        # Both tasks block until they are in flight together, so the test does not
+        # depend on timing; if they run one after another the wait times out
+        self.both_running = asyncio.Event()
+
+        async def slow_handler(data):
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            if self.running == 2:
+                self.both_running.set()
+            try:
+                await asyncio.wait_for(self.both_running.wait(), 1)
+            finally:
+                self.running -= 1
+
+        self.manager.register_task_handler('slow', slow_handler)
+
+    async def asyncTearDown(self):
+        await self.manager.cleanup()
+
+    async def test_slow_tasks_run_concurrently(self):
+        await self.manager.start_workers()
+        await self.manager.submit_task('slow', {})
+        await self.manager.submit_task('slow', {})
+        await self.manager.wait_for_completion(timeout=5)
+
+        self.assertEqual(self.peak, 2)
+        self.assertEqual(self.manager.get_task_statistics()['completed_tasks'], 2)
+
+    async def test_backlog_queued_before_start_is_split(self):
+        # Both tasks are already pending when the first worker wakes
+        await self.manager.submit_task('slow', {})
+        await self.manager.submit_task('slow', {})
+        await self.manager.start_workers()
+        await self.manager.wait_for_completion(timeout=5)
+
+        self.assertEqual(self.peak, 2)
+        self.assertEqual(self.manager.get_task_statistics()['completed_tasks'], 2)
+
+
+class WorkerManagerShutdownTest(unittest.IsolatedAsyncioTestCase):
+    """Tasks a cancelled worker never finished are counted as failed."""
+
+    async def test_unfinished_batch_is_recorded(self):
+        manager = WorkerManager(max_workers=1)
+        manager.shutdown_timeout = 0.01
+        blocked = asyncio.Event()
+
+        async def stuck_handler(data):
+            await blocked.wait()
+
+        manager.register_task_handler('stuck', stuck_handler)
+        # A single worker drains all three as one batch
+        for _ in range(3):
+            await manager.submit_task('stuck', {})
+        await manager.start_workers()
+        await asyncio.sleep(0)
+        await manager.stop_workers()
+
+        stats = manager.get_task_statistics()
+        self.assertEqual(stats['failed_tasks'], 3)
+        self.assertEqual(stats['completed_tasks'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,7 @@
 """
 Data channel management for WebRTC connections.
 """
+import asyncio
 import json
 import datetime
 from typing import Dict, Optional, Callable, Any
@@ -28,12 +29,22 @@ except ImportError:
         def send(self, data):
             pass
 
-# Use absolute imports to avoid relative import issues
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Prefer orjson for encoding outbound frames; fall back to stdlib json
+try:
+    import orjson
+    
+    def json_dumps(message: Dict[str, Any]) -> str:
+        try:
+            return orjson.dumps(message).decode()
+        except TypeError:
+            # orjson is stricter (non-str keys, oversized ints); defer to stdlib
+            return json.dumps(message)
+except ImportError:
+    json_dumps = json.dumps
 
-from core.logging import LoggerMixin, debug_log
+from core.logging import LoggerMixin, debug_log, DEBUG_ENABLED
+
+_now = datetime.datetime.now
 
 
 class DataChannelManager(LoggerMixin):
@@ -84,7 +95,6 @@ class DataChannelManager(LoggerMixin):
                 try:
                     result = handler(message, channel)
                     # If handler returns a coroutine, await it
-                    import asyncio
                     if asyncio.iscoroutine(result):
                         await result
                 except Exception as e:
@@ -109,6 +119,10 @@ class DataChannelManager(LoggerMixin):
     
     def send_message(self, client_id: int, message: Dict[str, Any]) -> bool:
         """Send a message to a specific client."""
+        return self._send_encoded(client_id, message, None)
+    
+    def _send_encoded(self, client_id: int, message: Dict[str, Any], message_str: Optional[str]) -> bool:
+        """Send a message, reusing an already-encoded frame when provided."""
         if client_id not in self.data_channels:
             self.log_warning(f"Cannot send message: client not found", {
                 "client_id": client_id,
@@ -118,14 +132,16 @@ class DataChannelManager(LoggerMixin):
         
         try:
             channel = self.data_channels[client_id]
-            message_str = json.dumps(message)
+            if message_str is None:
+                message_str = json_dumps(message)
             
-            debug_log(f"📤 [DataChannel] Sending message to client", {
-                "client_id": client_id,
-                "action": message.get('action'),
-                "message_length": len(message_str),
-                "timestamp": datetime.datetime.now().isoformat()
-            })
+            if DEBUG_ENABLED:
+                debug_log(f"📤 [DataChannel] Sending message to client", {
+                    "client_id": client_id,
+                    "action": message.get('action'),
+                    "message_length": len(message_str),
+                    "timestamp": _now().isoformat()
+                })
             
             channel.send(message_str)
             return True
@@ -142,23 +158,27 @@ class DataChannelManager(LoggerMixin):
         """Broadcast a message to all clients except the excluded one."""
         sent_count = 0
         
-        debug_log(f"📤 [DataChannel] Broadcasting message", {
-            "action": message.get('action'),
-            "exclude_client_id": exclude_client_id,
-            "total_clients": len(self.data_channels),
-            "message_keys": list(message.keys()),
-            "timestamp": datetime.datetime.now().isoformat()
-        })
+        if DEBUG_ENABLED:
+            debug_log(f"📤 [DataChannel] Broadcasting message", {
+                "action": message.get('action'),
+                "exclude_client_id": exclude_client_id,
+                "total_clients": len(self.data_channels),
+                "message_keys": list(message.keys()),
+                "timestamp": _now().isoformat()
+            })
         
-        for client_id, channel in self.data_channels.items():
+        # Encode once and reuse the frame for every recipient
+        message_str = json_dumps(message)
+        for client_id in list(self.data_channels):
             if client_id != exclude_client_id:
-                if self.send_message(client_id, message):
+                if self._send_encoded(client_id, message, message_str):
                     sent_count += 1
         
-        debug_log(f"📤 [DataChannel] Broadcast completed", {
-            "sent_count": sent_count,
-            "total_clients": len(self.data_channels)
-        })
+        if DEBUG_ENABLED:
+            debug_log(f"📤 [DataChannel] Broadcast completed", {
+                "sent_count": sent_count,
+                "total_clients": len(self.data_channels)
+            })
         
         return sent_count
     
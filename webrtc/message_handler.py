@@ -17,12 +17,19 @@ except ImportError:
             self.label = "mock-channel"
             self.readyState = "open"
 
-# Use absolute imports to avoid relative import issues
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Prefer orjson for decoding inbound frames; fall back to stdlib json
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    json_loads = json.loads
+
+from core.logging import LoggerMixin, debug_log, DEBUG_ENABLED
+from core.jupyter_message_factory import JupyterMessageFactory
 
-from core.logging import LoggerMixin, debug_log
+# Actions whose wrapped {instanceId, url, data} structure must be preserved
+WS_ACTIONS = frozenset(('ws_connect', 'ws_message', 'ws_close'))
+
+_now = datetime.datetime.now
 
 
 class WebRTCMessageHandler(LoggerMixin):
@@ -51,20 +58,22 @@ class WebRTCMessageHandler(LoggerMixin):
     def handle_message(self, message: str, data_channel: RTCDataChannel):
         """Handle incoming WebRTC message."""
         try:
-            debug_log(f"🔵 [WebRTC] Message received from client {self.client_id}", {
-                "message_length": len(message) if hasattr(message, '__len__') else 'unknown',
-                "message_type": type(message).__name__,
-                "timestamp": datetime.datetime.now().isoformat()
-            })
+            if DEBUG_ENABLED:
+                debug_log(f"🔵 [WebRTC] Message received from client {self.client_id}", {
+                    "message_length": len(message) if hasattr(message, '__len__') else 'unknown',
+                    "message_type": type(message).__name__,
+                    "timestamp": _now().isoformat()
+                })
             
-            data = json.loads(message)
+            data = json_loads(message)
             
-            debug_log(f"🔵 [WebRTC] Parsed message data", {
-                "action": data.get('action'),
-                "client_id": self.client_id,
-                "message_keys": list(data.keys()),
-                "timestamp": datetime.datetime.now().isoformat()
-            })
+            if DEBUG_ENABLED:
+                debug_log(f"🔵 [WebRTC] Parsed message data", {
+                    "action": data.get('action'),
+                    "client_id": self.client_id,
+                    "message_keys": list(data.keys()),
+                    "timestamp": _now().isoformat()
+                })
             
             # Route message to appropriate handler
             action = data.get('action')
@@ -113,15 +122,16 @@ class WebRTCMessageHandler(LoggerMixin):
             # CRITICAL: For HTTP requests, preserve the full message structure
             # Don't extract just the 'data' field, keep url, method, headers, msgId
             message_data = data
-            debug_log(f"🔵 [WebRTC] HTTP request - preserving full message structure", {
-                "action": action,
-                "has_url": 'url' in data,
-                "has_method": 'method' in data,
-                "has_headers": 'headers' in data,
-                "has_msgId": 'msgId' in data,
-                "has_data": 'data' in data,
-                "message_keys": list(data.keys())
-            })
+            if DEBUG_ENABLED:
+                debug_log(f"🔵 [WebRTC] HTTP request - preserving full message structure", {
+                    "action": action,
+                    "has_url": 'url' in data,
+                    "has_method": 'method' in data,
+                    "has_headers": 'headers' in data,
+                    "has_msgId": 'msgId' in data,
+                    "has_data": 'data' in data,
+                    "message_keys": list(data.keys())
+                })
         elif action == 'canvas_data':
             # Reduce logging for canvas data (mouse movements)
             message_data = data
@@ -130,22 +140,24 @@ class WebRTCMessageHandler(LoggerMixin):
                 self._canvas_log_counter = 0
             self._canvas_log_counter += 1
             if self._canvas_log_counter % 100 == 0:
-                debug_log(f"🎨 [WebRTC] Canvas data (logged every 100th)", {
-                    "action": action,
-                    "count": self._canvas_log_counter,
-                    "message_keys": list(data.keys())
-                })
-        elif action in ['ws_connect', 'ws_message', 'ws_close']:
+                if DEBUG_ENABLED:
+                    debug_log(f"🎨 [WebRTC] Canvas data (logged every 100th)", {
+                        "action": action,
+                        "count": self._canvas_log_counter,
+                        "message_keys": list(data.keys())
+                    })
+        elif action in WS_ACTIONS:
             # ✅ CRITICAL FIX: Preserve wrapped WebSocket message structure
             # These actions have instanceId, url, data structure that must be preserved
             message_data = data
-            debug_log(f"🔌 [WebRTC] WebSocket action - preserving wrapped structure", {
-                "action": action,
-                "has_instanceId": 'instanceId' in data,
-                "has_url": 'url' in data,
-                "has_data": 'data' in data,
-                "message_keys": list(data.keys())
-            })
+            if DEBUG_ENABLED:
+                debug_log(f"🔌 [WebRTC] WebSocket action - preserving wrapped structure", {
+                    "action": action,
+                    "has_instanceId": 'instanceId' in data,
+                    "has_url": 'url' in data,
+                    "has_data": 'data' in data,
+                    "message_keys": list(data.keys())
+                })
         elif data.get('data'):
             message_data = data['data']
         else:
@@ -156,12 +168,13 @@ class WebRTCMessageHandler(LoggerMixin):
         if hasattr(self, 'client_id') and self.client_id is not None:
             message_data['client_id'] = self.client_id
         
-        debug_log(f"🔵 [WebRTC] Calling listeners for action", {
-            "action": action,
-            "listener_count": len(listeners),
-            "message_data": message_data,
-            "client_id": getattr(self, 'client_id', None)
-        })
+        if DEBUG_ENABLED:
+            debug_log(f"🔵 [WebRTC] Calling listeners for action", {
+                "action": action,
+                "listener_count": len(listeners),
+                "message_data": message_data,
+                "client_id": getattr(self, 'client_id', None)
+            })
         
         # Call all listeners
         for callback in listeners:
@@ -180,14 +193,15 @@ class WebRTCMessageHandler(LoggerMixin):
             kernel_data = data.get('data')
             if isinstance(kernel_data, str):
                 message_data = json.loads(kernel_data)
-                debug_log(f"🔵 [WebRTC] Kernel message parsed", {
-                    "msg_type": message_data.get('header', {}).get('msg_type'),
-                    "msg_id": message_data.get('header', {}).get('msg_id'),
-                    "parent_header": message_data.get('parent_header'),
-                    "content": message_data.get('content'),
-                    "metadata": message_data.get('metadata'),
-                    "buffers": message_data.get('buffers')
-                })
+                if DEBUG_ENABLED:
+                    debug_log(f"🔵 [WebRTC] Kernel message parsed", {
+                        "msg_type": JupyterMessageFactory.dig(message_data, 'header', 'msg_type'),
+                        "msg_id": JupyterMessageFactory.dig(message_data, 'header', 'msg_id'),
+                        "parent_header": message_data.get('parent_header'),
+                        "content": message_data.get('content'),
+                        "metadata": message_data.get('metadata'),
+                        "buffers": message_data.get('buffers')
+                    })
                 return message_data
             else:
                 return kernel_data
@@ -54,11 +54,6 @@ except ImportError:
         def send(self, data):
             pass
 
-# Use absolute imports to avoid relative import issues
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 from core.logging import LoggerMixin, debug_log
 from core.config import ServerConfig
 from webrtc.data_channel import DataChannelManager
@@ -350,7 +345,11 @@ class WebRTCPeerManager(LoggerMixin):
         return self.data_channel_manager.broadcast_message(message, exclude_client_id)
     
     def send_message(self, client_id: int, message: Dict[str, Any]) -> bool:
-        """Send a message to a specific client."""
+        """Send a message to a specific client.
+        
+        Non-blocking: the data channel queues the frame and flushes it from the
+        event loop, so this must be called from the loop thread.
+        """
         return self.data_channel_manager.send_message(client_id, message)
     
     def get_status(self) -> Dict[str, Any]:
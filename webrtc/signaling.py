@@ -3,11 +3,6 @@ WebRTC signaling management.
 """
 from typing import Dict, Any, Optional
 
-# Use absolute imports to avoid relative import issues
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 from core.logging import LoggerMixin
 
 